@@ -4,11 +4,15 @@ from conan.tools.gnu import PkgConfigDeps
 from conan.tools.meson import MesonToolchain, Meson
 from conan.tools.microsoft import MSBuildToolchain, vs_layout, MSBuildDeps, MSBuild
 from conan.tools.scm import Git, Version
-from conan.tools.files import chdir, get, rmdir, copy, replace_in_file
+from conan.tools.build import build_jobs, can_run
+from conan.tools.env import Environment
+from conan.tools.files import chdir, get, rmdir, copy, replace_in_file, load, save
 from conan.tools.layout import basic_layout
-from conans.errors import ConanInvalidConfiguration
+from conans.errors import ConanInvalidConfiguration, ConanException
 import glob
+import json
 import os
+import re
 import shutil
 
 required_conan_version = ">=1.29"
@@ -18,6 +22,7 @@ class GStreamerConan(ConanFile):
     _version = "1.22.2"
     _revision = ""
     version = _version+_revision
+    _rs_version = "0.10.5"
 
     description = "GStreamer is a development framework for creating applications like media players, video editors, streaming media broadcasters and so on"
     topics = ("conan", "gstreamer", "multimedia", "video", "audio", "broadcasting", "framework", "media")
@@ -26,6 +31,7 @@ class GStreamerConan(ConanFile):
     license = "GPL-2.0-only"
 
     settings = "os", "arch", "compiler", "build_type"
+    exports_sources = "subprojects/*"
     options = {
         "shared": [True, False],
         "fPIC": [True, False],
@@ -46,6 +52,13 @@ class GStreamerConan(ConanFile):
         "with_srtp": [True, False],
         "with_videoparsers": [True, False],
         "with_introspection": [True, False],
+        "headless": [True, False],
+        "with_tests": [True, False],
+        "with_metrics_tracer": [True, False],
+        "with_shm": [True, False],
+        "with_libav": [True, False],
+        # needs the gst-plugins-rs crates vendored in source(), which requires cargo in PATH
+        "with_threadshare": [True, False],
     }
     default_options = {
         "shared": False,
@@ -67,12 +80,28 @@ class GStreamerConan(ConanFile):
         "with_srtp": False,
         "with_videoparsers": True,
         "with_introspection": False,
+        "headless": False,
+        "with_tests": False,
+        "with_metrics_tracer": False,
+        "with_shm": False,
+        "with_libav": False,
+        "with_threadshare": False,
     }
 
     _gl_api = None
     _gl_platform = None
     _gl_winsys = None
 
+    # options forced off by the 'headless' preset: display, font and audio-device support
+    _headless_disabled_options = (
+        "with_libalsa", "with_libpng", "with_libjpeg", "with_graphene", "with_pango",
+        "with_gl", "with_egl", "with_wayland", "with_xorg",
+    )
+    # the same for FFmpeg when gst-libav is built, these only exist on Linux and FreeBSD
+    _headless_disabled_ffmpeg_options = (
+        "with_xlib", "with_pulse", "with_libalsa", "with_vaapi", "with_vdpau", "with_xcb",
+    )
+
     def requirements(self):
         self.requires("zlib/1.2.13")
         self.requires("glib/2.75.2")
@@ -112,6 +141,9 @@ class GStreamerConan(ConanFile):
             self.requires("libsrtp/2.4.2")
         if self.options.with_avtp:
             self.requires("libavtp/0.2.0@camposs/stable")
+        if self.options.with_libav:
+            # consumers such as the test_package benchmark can use the libavcodec gst-libav links
+            self.requires("ffmpeg/5.1", transitive_headers=True)
 
     @property
     def _is_msvc(self):
@@ -122,10 +154,20 @@ class GStreamerConan(ConanFile):
             del self.options.fPIC
         del self.settings.compiler.libcxx
         del self.settings.compiler.cppstd
+        if self.options.headless:
+            for option in self._headless_disabled_options:
+                if self.options.get_safe(option):
+                    self.output.info("headless preset: disabling '%s'" % option)
+                    setattr(self.options, option, False)
+            if self.options.with_libav and self.settings.os in ["Linux", "FreeBSD"]:
+                # FFmpeg would otherwise pull in X11, PulseAudio, ALSA and the VA-API/VDPAU drivers
+                for option in self._headless_disabled_ffmpeg_options:
+                    setattr(self.options["ffmpeg"], option, False)
 
     def config_options(self):
         if self.settings.os == 'Windows':
             del self.options.fPIC
+            del self.options.with_shm
         if self.settings.os != "Linux":
             del self.options.with_libalsa
             del self.options.with_wayland
@@ -163,6 +205,20 @@ class GStreamerConan(ConanFile):
             strip_root=True
             )
 
+        # gst-plugins-rs is a git wrap of the monorepo: fetch the release and vendor its crates here, so that
+        # with_threadshare builds run cargo offline. The tree is left untouched without with_threadshare.
+        rs_folder = os.path.join(self.source_folder, "subprojects", "gst-plugins-rs")
+        get(self,
+            "https://gitlab.freedesktop.org/gstreamer/gst-plugins-rs/-/archive/{0}/gst-plugins-rs-{0}.tar.gz".format(self._rs_version),
+            destination=rs_folder,
+            strip_root=True
+            )
+        if shutil.which("cargo"):
+            self.run('cargo vendor --manifest-path "{}" "{}"'.format(
+                os.path.join(rs_folder, "Cargo.toml"), os.path.join(rs_folder, "vendor")))
+        else:
+            self.output.info("cargo not found, the gst-plugins-rs crates are not vendored: with_threadshare cannot be built")
+
     def generate(self):
         if self._is_msvc:
             self.generate_msbuild()
@@ -222,10 +278,17 @@ class GStreamerConan(ConanFile):
         gl_api, gl_platform, gl_winsys = self._gl_config()
         # tc.project_options["tools"] = "disabled"
         tc.project_options["examples"] = "disabled"
-        tc.project_options["tests"] = "disabled"
+        tc.project_options["tests"] = "enabled" if self.options.with_tests else "disabled"
         tc.project_options["wrap_mode"] = "nofallback"
         tc.project_options["introspection"] = "enabled" if self.options.with_introspection else "disabled"
         tc.project_options["orc"] = "disabled"  # TODO: orc
+        tc.project_options["libav"] = "enabled" if self.options.with_libav else "disabled"
+        tc.project_options["rs"] = "enabled" if self.options.with_threadshare else "disabled"
+        # in-tree subprojects shipped with this recipe (see subprojects/)
+        custom_subprojects = []
+        if self.options.with_metrics_tracer:
+            custom_subprojects.append("gst-metrics-tracer")
+        tc.project_options["custom_subprojects"] = ",".join(custom_subprojects)
 
         self.output.warning("gstreamer recipe does not yet honor the settings provided by users !!!")
         # @todo: conan 2.0 does not provide a way to configure sub-project options yet
@@ -278,9 +341,30 @@ class GStreamerConan(ConanFile):
 
         subproject_options.append("[gst-plugins-bad:project options]")
         subproject_options.append("{} = '{}'".format("avtp", "enabled" if self.options.get_safe("with_avtp") else "disabled"))
+        subproject_options.append("{} = '{}'".format("shm", "enabled" if self.options.get_safe("with_shm") else "disabled"))
         subproject_options.append("{} = '{}'".format("srtp", "enabled" if self.options.get_safe("with_srtp") else "disabled"))
         subproject_options.append("{} = '{}'".format("videoparsers", "enabled" if self.options.get_safe("with_videoparsers") else "disabled"))
 
+        good_options = []
+        if self.options.headless:
+            # keep auto-detected system display, font and audio-device libraries out of the build
+            for option in ["gl", "vulkan", "wayland", "x11", "ttml"]:
+                subproject_options.append("{} = '{}'".format(option, "disabled"))
+            for option in ["cairo", "gtk3", "jack", "oss", "oss4", "pulse", "qt5", "ximagesrc"]:
+                good_options.append("{} = '{}'".format(option, "disabled"))
+        if self.options.with_threadshare:
+            # udpsrc is the baseline the threadshare elements are benchmarked against
+            good_options.append("{} = '{}'".format("udp", "enabled"))
+        if good_options:
+            subproject_options.append("[gst-plugins-good:project options]")
+            subproject_options.extend(good_options)
+
+        if self.options.with_threadshare:
+            # threadshare only, the other gst-plugins-rs features default to 'auto'
+            subproject_options.append("[gst-plugins-rs:project options]")
+            for option in self._rs_feature_options():
+                subproject_options.append("{} = '{}'".format(option, "enabled" if option == "threadshare" else "disabled"))
+
         # does not work for cross-platform builds
         self.output.warning("patching generated file: {}".format(tc.native_filename))
         replace_in_file(self, os.path.join(self.generators_folder, tc.native_filename),
@@ -299,9 +383,72 @@ class GStreamerConan(ConanFile):
 
     def build(self):
         # with tools.environment_append(VisualStudioBuildEnvironment(self).vars) if self._is_msvc else tools.no_op():
+        env = Environment()
+        if self.options.with_threadshare:
+            self._check_rust_toolchain()
+            env.define_path("CARGO_HOME", self._setup_cargo_home())
+            env.define("CARGO_NET_OFFLINE", "true")
         meson = Meson(self)
-        meson.configure()
-        meson.build()
+        with env.vars(self).apply():
+            meson.configure()
+            meson.build()
+        if self.options.with_tests and can_run(self) and not self.conf.get("tools.build:skip_test", check_type=bool):
+            self._run_tests()
+
+    def _check_rust_toolchain(self):
+        # gst-plugins-rs builds its plugins through cargo-c
+        missing = [tool for tool in ("rustc", "cargo", "cargo-cbuild") if not shutil.which(tool)]
+        if missing:
+            raise ConanException("with_threadshare needs a Rust toolchain with cargo-c in PATH, not found: {}".format(
+                ", ".join(missing)))
+
+    def _rs_feature_options(self):
+        options_file = os.path.join(self.source_folder, "subprojects", "gst-plugins-rs", "meson_options.txt")
+        return re.findall(r"option\(\s*'([^']+)'\s*,\s*type\s*:\s*'feature'", load(self, options_file))
+
+    def _setup_cargo_home(self):
+        # cargo is pointed at the crates vendored in source()
+        vendor_folder = os.path.join(self.source_folder, "subprojects", "gst-plugins-rs", "vendor")
+        if not os.path.isdir(vendor_folder):
+            raise ConanException("gst-plugins-rs crates are not vendored, cargo must be in PATH when fetching the sources")
+        cargo_home = os.path.join(self.build_folder, "cargo-home")
+        save(self, os.path.join(cargo_home, "config.toml"),
+             '[source.crates-io]\nreplace-with = "vendored-sources"\n\n'
+             '[source.vendored-sources]\ndirectory = "{}"\n\n'
+             '[net]\noffline = true\n'.format(vendor_folder.replace("\\", "/")))
+        return cargo_home
+
+    def _run_tests(self):
+        timeout_multiplier = self.conf.get("user.gstreamer:test_timeout_multiplier", default=1)
+        cmd = 'meson test -C "{}" --num-processes {} --timeout-multiplier {} --print-errorlogs'.format(
+            self.build_folder, build_jobs(self), timeout_multiplier)
+        cmd += " --suite gstreamer --suite gst-plugins-base"
+        try:
+            self.run(cmd)
+        finally:
+            self._report_test_timings()
+
+    def _report_test_timings(self, slowest=20):
+        testlog = os.path.join(self.build_folder, "meson-logs", "testlog.json")
+        if not os.path.isfile(testlog):
+            self.output.warning("no test log found: {}".format(testlog))
+            return
+        results = []
+        with open(testlog) as f:
+            for line in f:
+                if line.strip():
+                    results.append(json.loads(line))
+        results.sort(key=lambda result: result["duration"], reverse=True)
+
+        report = os.path.join(self.build_folder, "test-timings.txt")
+        with open(report, "w") as f:
+            for result in results:
+                f.write("{:10.3f}s  {:8}  {}\n".format(result["duration"], result["result"], result["name"]))
+        self.output.info("test timings written to: {}".format(report))
+        self.output.info("total test time: {:.3f}s over {} tests".format(
+            sum(result["duration"] for result in results), len(results)))
+        for result in results[:slowest]:
+            self.output.info("{:10.3f}s  {:8}  {}".format(result["duration"], result["result"], result["name"]))
 
     def _fix_library_names(self, path):
         # regression in 1.16
@@ -323,11 +470,24 @@ class GStreamerConan(ConanFile):
         rmdir(self, os.path.join(self.package_folder, "lib", "pkgconfig"))
         rmdir(self, os.path.join(self.package_folder, "lib", "gstreamer-1.0", "pkgconfig"))
         rmdir(self, os.path.join(self.package_folder, "share"))
+        self._report_footprint()
         # @todo
         #tools.remove_files_by_mask(self.package_folder, "*.pdb")
 
-    # def package_id(self):
-    #     self.info.requires["glib"].full_package_mode()
+    def _report_footprint(self):
+        package_size = 0
+        for root, _, files in os.walk(self.package_folder):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if not os.path.islink(path):
+                    package_size += os.path.getsize(path)
+        self.output.info("package size: %.1f MiB" % (package_size / (1024.0 * 1024.0)))
+        self.output.info("transitive host dependencies: %d" % len(list(self.dependencies.host.values())))
+
+    def package_id(self):
+        # self.info.requires["glib"].full_package_mode()
+        # running the upstream test suite does not change the packaged binaries
+        del self.info.options.with_tests
 
     def package_info(self):
         gst_plugins = []
@@ -386,7 +546,7 @@ class GStreamerConan(ConanFile):
             self.cpp_info.components["gstreamer-check-1.0"].system_libs = ["rt", "m"]
         self.cpp_info.components["gstreamer-check-1.0"].set_property("pkg_config_custom_content", pkgconfig_custom_content)
 
-        # gstcoreelements and gstcoretracers are plugins which should be loaded dynamicaly, and not linked to directly
+        # gstcoreelements, gstcoretracers and gstmetricstracer are plugins which should be loaded dynamicaly, and not linked to directly
         if not self.options.shared:
             self.cpp_info.components["gstcoreelements"].names["pkg_config"] = "gstcoreelements"
             self.cpp_info.components["gstcoreelements"].requires = ["glib::gobject-2.0", "glib::glib-2.0", "gstreamer-1.0", "gstreamer-base-1.0"]
@@ -400,6 +560,13 @@ class GStreamerConan(ConanFile):
             self.cpp_info.components["gstcoretracers"].includedirs = [os.path.join("include", "gstreamer-1.0")]
             self.cpp_info.components["gstcoretracers"].libdirs = [gst_plugin_path]
 
+            if self.options.with_metrics_tracer:
+                self.cpp_info.components["gstmetricstracer"].names["pkg_config"] = "gstmetricstracer"
+                self.cpp_info.components["gstmetricstracer"].requires = ["gstreamer-1.0", "glib::gio-2.0"]
+                self.cpp_info.components["gstmetricstracer"].libs = ["gstmetricstracer"]
+                self.cpp_info.components["gstmetricstracer"].includedirs = [os.path.join("include", "gstreamer-1.0")]
+                self.cpp_info.components["gstmetricstracer"].libdirs = [gst_plugin_path]
+
         if self.options.shared:
             self.output.info("Appending GST_PLUGIN_PATH env var : %s" % gst_plugin_path)
             self.env_info.GST_PLUGIN_PATH.append(gst_plugin_path)
@@ -645,7 +812,53 @@ class GStreamerConan(ConanFile):
                 "libsrtp::libsrtp", "glib::glib-2.0", "glib::gobject-2.0"]
             gst_plugins.append("gstsrtp")
 
+        if self.options.get_safe("with_videoparsers"):
+            self.cpp_info.components["gstvideoparsers"].libs = ["gstvideoparsers"]
+            self.cpp_info.components["gstvideoparsers"].libdirs.append(gst_plugin_path)
+            self.cpp_info.components["gstvideoparsers"].requires = [
+                "gstreamer-1.0", "gstreamer-base-1.0",
+                "gstreamer-pbutils-1.0", "gstreamer-video-1.0", "gstreamer-codecparsers-1.0",
+                "glib::glib-2.0", "glib::gobject-2.0"]
+            gst_plugins.append("gstvideoparsers")
+
+        if self.options.with_libav:
+            self.cpp_info.components["gstlibav"].libs = ["gstlibav"]
+            self.cpp_info.components["gstlibav"].libdirs.append(gst_plugin_path)
+            self.cpp_info.components["gstlibav"].requires = [
+                "gstreamer-1.0", "gstreamer-base-1.0",
+                "gstreamer-audio-1.0", "gstreamer-video-1.0", "gstreamer-pbutils-1.0",
+                "ffmpeg::avfilter", "ffmpeg::avformat", "ffmpeg::avcodec", "ffmpeg::avutil",
+                "glib::glib-2.0", "glib::gobject-2.0"]
+            gst_plugins.append("gstlibav")
+
+        if self.options.with_threadshare:
+            self.cpp_info.components["gstthreadshare"].libs = ["gstthreadshare"]
+            self.cpp_info.components["gstthreadshare"].libdirs.append(gst_plugin_path)
+            self.cpp_info.components["gstthreadshare"].requires = [
+                "gstreamer-1.0", "gstreamer-base-1.0", "gstreamer-net-1.0", "gstreamer-rtp-1.0",
+                "glib::glib-2.0", "glib::gobject-2.0", "glib::gio-2.0"]
+            if self.settings.os == "Linux":
+                self.cpp_info.components["gstthreadshare"].system_libs = ["dl", "pthread", "m", "rt"]
+            gst_plugins.append("gstthreadshare")
+
+            self.cpp_info.components["gstudp"].libs = ["gstudp"]
+            self.cpp_info.components["gstudp"].libdirs.append(gst_plugin_path)
+            self.cpp_info.components["gstudp"].requires = [
+                "gstreamer-1.0", "gstreamer-base-1.0", "gstreamer-net-1.0",
+                "glib::glib-2.0", "glib::gobject-2.0", "glib::gio-2.0"]
+            gst_plugins.append("gstudp")
+
         # Plugins ('sys')
+        if self.options.get_safe("with_shm"):
+            self.cpp_info.components["gstshm"].libs = ["gstshm"]
+            self.cpp_info.components["gstshm"].libdirs.append(gst_plugin_path)
+            self.cpp_info.components["gstshm"].requires = [
+                "gstreamer-1.0", "gstreamer-base-1.0",
+                "glib::glib-2.0", "glib::gobject-2.0"]
+            if self.settings.os == "Linux":
+                self.cpp_info.components["gstshm"].system_libs = ["rt"]
+            gst_plugins.append("gstshm")
+
         if self.options.get_safe("with_xorg"):
             self.cpp_info.components["gstximagesink"].libs = ["gstximagesink"]
             self.cpp_info.components["gstximagesink"].libdirs.append(gst_plugin_path)
@@ -696,6 +909,14 @@ class GStreamerConan(ConanFile):
             self.cpp_info.components["gstreamer-audio-1.0"].system_libs = ["m"]
         self.cpp_info.components["gstreamer-audio-1.0"].set_property("pkg_config_custom_content", pkgconfig_custom_content)
 
+        self.cpp_info.components["gstreamer-codecparsers-1.0"].names["pkg_config"] = "gstreamer-codecparsers-1.0"
+        self.cpp_info.components["gstreamer-codecparsers-1.0"].libs = ["gstcodecparsers-1.0"]
+        self.cpp_info.components["gstreamer-codecparsers-1.0"].requires = ["gstreamer-1.0", "gstreamer-base-1.0"]
+        self.cpp_info.components["gstreamer-codecparsers-1.0"].includedirs = [gst_include_path]
+        if self.settings.os == "Linux":
+            self.cpp_info.components["gstreamer-codecparsers-1.0"].system_libs = ["m"]
+        self.cpp_info.components["gstreamer-codecparsers-1.0"].set_property("pkg_config_custom_content", pkgconfig_custom_content)
+
         self.cpp_info.components["gstreamer-fft-1.0"].names["pkg_config"] = "gstreamer-fft-1.0"
         self.cpp_info.components["gstreamer-fft-1.0"].libs = ["gstfft-1.0"]
         self.cpp_info.components["gstreamer-fft-1.0"].requires = ["gstreamer-1.0"]
@@ -0,0 +1,907 @@
+/* GStreamer OpenMetrics tracer
+ *
+ * This library is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU Library General Public
+ * License as published by the Free Software Foundation; either
+ * version 2 of the License, or (at your option) any later version.
+ *
+ * This library is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+ * Library General Public License for more details.
+ */
+
+/**
+ * SECTION:tracer-openmetrics
+ * @short_description: export pipeline metrics as OpenMetrics text
+ *
+ * A low overhead tracer aggregating per-pad buffer and byte counts,
+ * per-element processing time, reported latency and queue fill levels.
+ * Counters are updated with atomic operations from the streaming threads;
+ * a lock is only taken the first time a pad or element is seen. The series
+ * are labelled with the top-level pipeline and the path of the element in
+ * it, and are removed once their pad or element is finalized.
+ *
+ * The metrics are exposed in the OpenMetrics text format, either served over
+ * HTTP on a local socket or periodically written to a file:
+ *
+ * |[
+ * GST_TRACERS="openmetrics(port=9464)" gst-launch-1.0 ...
+ * GST_TRACERS="openmetrics(socket=/run/gst-metrics.sock)" gst-launch-1.0 ...
+ * GST_TRACERS="openmetrics(file=/tmp/gst.prom,interval=1000)" gst-launch-1.0 ...
+ * ]|
+ *
+ * Without parameters the metrics are written to
+ * `gst-metrics-<pid>.prom` in the temporary directory every second.
+ */
+
+#include <string.h>
+
+#include <gst/gst.h>
+#include <gst/gsttracer.h>
+#include <gio/gio.h>
+#include <glib/gstdio.h>
+
+#ifdef G_OS_WIN32
+#include <process.h>
+#define getpid _getpid
+#else
+#include <unistd.h>
+#endif
+
+#if defined(_MSC_VER) && !defined(__clang__)
+#include <windows.h>
+#endif
+
+GST_DEBUG_CATEGORY_STATIC (gst_metrics_tracer_debug);
+#define GST_CAT_DEFAULT gst_metrics_tracer_debug
+
+#define OPENMETRICS_CONTENT_TYPE \
+    "application/openmetrics-text; version=1.0.0; charset=utf-8"
+#define DEFAULT_INTERVAL_MS 1000
+
+#define GST_TYPE_METRICS_TRACER (gst_metrics_tracer_get_type ())
+G_DECLARE_FINAL_TYPE (GstMetricsTracer, gst_metrics_tracer, GST,
+    METRICS_TRACER, GstTracer);
+
+/* protects the tables, never taken for counter updates; shared with the
+ * stats so it outlives the tracer while objects still carry stats */
+typedef struct
+{
+  GMutex lock;
+  GHashTable *pads;
+  GHashTable *elements;
+} Registry;
+
+/* common part of the pad and element stats, which live as long as the object
+ * they describe: one reference is held by the object qdata and one by the
+ * registry table, which drops it when the object is finalized */
+typedef struct
+{
+  Registry *registry;
+  GHashTable *table;
+  gpointer object;
+  GDestroyNotify clear;
+  gchar *pipeline;
+  gchar *element;
+} Stats;
+
+typedef struct
+{
+  Stats stats;
+  gchar *pad;
+  guint64 buffers;
+  guint64 bytes;
+} PadStats;
+
+typedef struct
+{
+  Stats stats;
+  guint64 processed;
+  guint64 processing_ns;
+  guint64 latency_ns;
+  gboolean is_queue;
+  GWeakRef queue;
+} ElementStats;
+
+typedef struct
+{
+  GstElement *element;
+  GstClockTime ts;
+  guint64 buffers;
+  /* time spent in the pushes nested in this one */
+  GstClockTime nested;
+} PushFrame;
+
+struct _GstMetricsTracer
+{
+  GstTracer parent;
+
+  Registry *registry;
+
+  gchar *file;
+  gchar *socket_path;
+  gint port;
+  gint interval;
+
+  GMainContext *context;
+  GMainLoop *loop;
+  GThread *thread;
+  GSocketService *service;
+  gulong run_handler;
+};
+
+G_DEFINE_TYPE (GstMetricsTracer, gst_metrics_tracer, GST_TYPE_TRACER);
+
+static GQuark stats_quark;
+static GPrivate push_stack = G_PRIVATE_INIT ((GDestroyNotify) g_array_unref);
+
+/* counters */
+
+static inline void
+counter_add (guint64 * counter, guint64 value)
+{
+#if defined(_MSC_VER) && !defined(__clang__)
+  InterlockedExchangeAdd64 ((volatile LONG64 *) counter, (LONG64) value);
+#else
+  __atomic_fetch_add (counter, value, __ATOMIC_RELAXED);
+#endif
+}
+
+static inline void
+counter_set (guint64 * counter, guint64 value)
+{
+#if defined(_MSC_VER) && !defined(__clang__)
+  InterlockedExchange64 ((volatile LONG64 *) counter, (LONG64) value);
+#else
+  __atomic_store_n (counter, value, __ATOMIC_RELAXED);
+#endif
+}
+
+static inline guint64
+counter_get (guint64 * counter)
+{
+#if defined(_MSC_VER) && !defined(__clang__)
+  return (guint64) InterlockedCompareExchange64 ((volatile LONG64 *) counter,
+      0, 0);
+#else
+  return __atomic_load_n (counter, __ATOMIC_RELAXED);
+#endif
+}
+
+/* stats */
+
+static void stats_unref (gpointer stats);
+
+static Registry *
+registry_new (void)
+{
+  Registry *registry = g_atomic_rc_box_new0 (Registry);
+
+  g_mutex_init (&registry->lock);
+  registry->pads = g_hash_table_new_full (NULL, NULL, NULL, stats_unref);
+  registry->elements = g_hash_table_new_full (NULL, NULL, NULL, stats_unref);
+  return registry;
+}
+
+static void
+registry_clear (Registry * registry)
+{
+  g_hash_table_destroy (registry->pads);
+  g_hash_table_destroy (registry->elements);
+  g_mutex_clear (&registry->lock);
+}
+
+static void
+registry_unref (Registry * registry)
+{
+  g_atomic_rc_box_release_full (registry, (GDestroyNotify) registry_clear);
+}
+
+static void
+stats_clear (Stats * stats)
+{
+  stats->clear (stats);
+  g_free (stats->pipeline);
+  g_free (stats->element);
+  registry_unref (stats->registry);
+}
+
+static gpointer
+stats_ref (gpointer stats)
+{
+  return g_atomic_rc_box_acquire (stats);
+}
+
+static void
+stats_unref (gpointer stats)
+{
+  g_atomic_rc_box_release_full (stats, (GDestroyNotify) stats_clear);
+}
+
+static void
+pad_stats_clear (PadStats * stats)
+{
+  g_free (stats->pad);
+}
+
+static void
+element_stats_clear (ElementStats * stats)
+{
+  g_weak_ref_clear (&stats->queue);
+}
+
+/* labels: the top-level bin and the path of the element below it */
+static void
+stats_init (Stats * stats, Registry * registry, GHashTable * table,
+    gpointer object, GstElement * element, GDestroyNotify clear)
+{
+  GPtrArray *names = g_ptr_array_new_with_free_func (g_free);
+  GstObject *current = gst_object_ref (element);
+  GstObject *parent;
+  GString *path = g_string_new (NULL);
+  guint i;
+
+  do {
+    g_ptr_array_add (names, gst_object_get_name (current));
+    parent = gst_object_get_parent (current);
+    gst_object_unref (current);
+  } while ((current = parent));
+
+  /* an element outside of any bin is its own pipeline */
+  for (i = names->len > 1 ? names->len - 1 : 1; i > 0; i--) {
+    if (path->len)
+      g_string_append_c (path, '/');
+    g_string_append (path, g_ptr_array_index (names, i - 1));
+  }
+
+  stats->registry = g_atomic_rc_box_acquire (registry);
+  stats->table = table;
+  stats->object = object;
+  stats->clear = clear;
+  stats->pipeline = g_strdup (g_ptr_array_index (names, names->len - 1));
+  stats->element = g_string_free (path, FALSE);
+  g_ptr_array_unref (names);
+}
+
+/* qdata destroy notify, the object is being finalized */
+static void
+stats_object_finalized (gpointer data)
+{
+  Stats *stats = data;
+  Registry *registry = stats->registry;
+
+  g_mutex_lock (&registry->lock);
+  if (g_hash_table_lookup (stats->table, stats->object) == stats)
+    g_hash_table_remove (stats->table, stats->object);
+  g_mutex_unlock (&registry->lock);
+  stats_unref (stats);
+}
+
+/* registers new stats unless another streaming thread was first, the stats
+ * returned stay valid as long as the object is alive */
+static gpointer
+stats_register (Stats * stats)
+{
+  Registry *registry = stats->registry;
+  Stats *registered;
+
+  g_mutex_lock (&registry->lock);
+  registered = g_object_get_qdata (G_OBJECT (stats->object), stats_quark);
+  if (!registered) {
+    g_hash_table_insert (stats->table, stats->object, stats_ref (stats));
+    g_object_set_qdata_full (G_OBJECT (stats->object), stats_quark, stats,
+        stats_object_finalized);
+  }
+  g_mutex_unlock (&registry->lock);
+
+  if (registered) {
+    stats_unref (stats);
+    return registered;
+  }
+  return stats;
+}
+
+/* only pads directly owned by a non-bin element are accounted, this skips
+ * the proxy pads of ghost pads */
+static GstElement *
+get_real_element (GstPad * pad)
+{
+  GstObject *parent = GST_OBJECT_PARENT (pad);
+
+  if (!parent || !GST_IS_ELEMENT (parent) || GST_IS_BIN (parent))
+    return NULL;
+  return GST_ELEMENT_CAST (parent);
+}
+
+static PadStats *
+get_pad_stats (GstMetricsTracer * self, GstPad * pad, GstElement * element)
+{
+  PadStats *stats = g_object_get_qdata (G_OBJECT (pad), stats_quark);
+
+  if (G_LIKELY (stats))
+    return stats;
+
+  stats = g_atomic_rc_box_new0 (PadStats);
+  stats_init (&stats->stats, self->registry, self->registry->pads, pad,
+      element, (GDestroyNotify) pad_stats_clear);
+  stats->pad = gst_object_get_name (GST_OBJECT (pad));
+  return stats_register (&stats->stats);
+}
+
+static ElementStats *
+get_element_stats (GstMetricsTracer * self, GstElement * element)
+{
+  ElementStats *stats = g_object_get_qdata (G_OBJECT (element), stats_quark);
+  GstElementFactory *factory;
+  const gchar *name;
+
+  if (G_LIKELY (stats))
+    return stats;
+
+  stats = g_atomic_rc_box_new0 (ElementStats);
+  stats_init (&stats->stats, self->registry, self->registry->elements,
+      element, element, (GDestroyNotify) element_stats_clear);
+  factory = gst_element_get_factory (element);
+  name = factory ? GST_OBJECT_NAME (factory) : NULL;
+  stats->is_queue = !g_strcmp0 (name, "queue") || !g_strcmp0 (name, "queue2");
+  g_weak_ref_init (&stats->queue, stats->is_queue ? element : NULL);
+  return stats_register (&stats->stats);
+}
+
+static GArray *
+get_push_stack (void)
+{
+  GArray *stack = g_private_get (&push_stack);
+
+  if (G_UNLIKELY (!stack)) {
+    stack = g_array_sized_new (FALSE, FALSE, sizeof (PushFrame), 8);
+    g_private_set (&push_stack, stack);
+  }
+  return stack;
+}
+
+/* hooks */
+
+static void
+do_push_pre (GstMetricsTracer * self, GstClockTime ts, GstPad * pad,
+    guint64 buffers, guint64 bytes)
+{
+  GstElement *element = get_real_element (pad);
+  GstPad *peer = GST_PAD_PEER (pad);
+  PushFrame frame;
+
+  if (element) {
+    PadStats *stats = get_pad_stats (self, pad, element);
+
+    counter_add (&stats->buffers, buffers);
+    counter_add (&stats->bytes, bytes);
+  }
+
+  frame.element = peer ? get_real_element (peer) : NULL;
+  frame.ts = ts;
+  frame.buffers = buffers;
+  frame.nested = 0;
+  g_array_append_val (get_push_stack (), frame);
+}
+
+static void
+do_push_buffer_pre (GstTracer * tracer, GstClockTime ts, GstPad * pad,
+    GstBuffer * buffer)
+{
+  do_push_pre (GST_METRICS_TRACER (tracer), ts, pad, 1,
+      gst_buffer_get_size (buffer));
+}
+
+static void
+do_push_buffer_list_pre (GstTracer * tracer, GstClockTime ts, GstPad * pad,
+    GstBufferList * list)
+{
+  do_push_pre (GST_METRICS_TRACER (tracer), ts, pad,
+      gst_buffer_list_length (list), gst_buffer_list_calculate_size (list));
+}
+
+/* the peer element handled the push between pre and post, its own processing
+ * time is that minus the pushes it made downstream from within the call,
+ * which also accounts sinks and elements not pushing synchronously */
+static void
+do_push_post (GstTracer * tracer, GstClockTime ts, GstPad * pad,
+    GstFlowReturn res)
+{
+  GArray *stack = get_push_stack ();
+  PushFrame frame;
+  GstClockTime inclusive;
+
+  if (G_UNLIKELY (stack->len == 0))
+    return;
+
+  frame = g_array_index (stack, PushFrame, stack->len - 1);
+  g_array_set_size (stack, stack->len - 1);
+  inclusive = ts - frame.ts;
+
+  if (frame.element) {
+    ElementStats *stats =
+        get_element_stats (GST_METRICS_TRACER (tracer), frame.element);
+
+    counter_add (&stats->processed, frame.buffers);
+    counter_add (&stats->processing_ns,
+        inclusive > frame.nested ? inclusive - frame.nested : 0);
+  }
+  if (stack->len > 0)
+    g_array_index (stack, PushFrame, stack->len - 1).nested += inclusive;
+}
+
+static void
+do_element_query_post (GstTracer * tracer, GstClockTime ts,
+    GstElement * element, GstQuery * query, gboolean res)
+{
+  GstClockTime min_latency;
+
+  if (!res || GST_QUERY_TYPE (query) != GST_QUERY_LATENCY)
+    return;
+
+  gst_query_parse_latency (query, NULL, &min_latency, NULL);
+  if (GST_CLOCK_TIME_IS_VALID (min_latency))
+    counter_set (&get_element_stats (GST_METRICS_TRACER (tracer),
+            element)->latency_ns, min_latency);
+}
+
+/* exposition */
+
+static void
+append_label_value (GString * out, const gchar * value)
+{
+  for (; *value; value++) {
+    switch (*value) {
+      case '\\':
+        g_string_append (out, "\\\\");
+        break;
+      case '"':
+        g_string_append (out, "\\\"");
+        break;
+      case '\n':
+        g_string_append (out, "\\n");
+        break;
+      default:
+        g_string_append_c (out, *value);
+        break;
+    }
+  }
+}
+
+static void
+append_family (GString * out, const gchar * name, const gchar * type,
+    const gchar * unit, const gchar * help)
+{
+  g_string_append_printf (out, "# TYPE %s %s\n", name, type);
+  if (unit)
+    g_string_append_printf (out, "# UNIT %s %s\n", name, unit);
+  g_string_append_printf (out, "# HELP %s %s\n", name, help);
+}
+
+static void
+append_labels (GString * out, Stats * stats)
+{
+  g_string_append (out, "{pipeline=\"");
+  append_label_value (out, stats->pipeline);
+  g_string_append (out, "\",element=\"");
+  append_label_value (out, stats->element);
+  g_string_append_c (out, '"');
+}
+
+static void
+append_pad_sample (GString * out, const gchar * name, PadStats * stats,
+    guint64 value)
+{
+  g_string_append (out, name);
+  append_labels (out, &stats->stats);
+  g_string_append (out, ",pad=\"");
+  append_label_value (out, stats->pad);
+  g_string_append_printf (out, "\"} %" G_GUINT64_FORMAT "\n", value);
+}
+
+static void
+append_element_sample (GString * out, const gchar * name,
+    ElementStats * stats, const gchar * value)
+{
+  g_string_append (out, name);
+  append_labels (out, &stats->stats);
+  g_string_append_printf (out, "} %s\n", value);
+}
+
+/* only takes the registry, so that scrapes still running on the socket
+ * service threads do not depend on the tracer */
+static gchar *
+registry_render (Registry * registry)
+{
+  GString *out = g_string_new (NULL);
+  GPtrArray *pads, *elements, *queue_stats, *queues;
+  GHashTableIter iter;
+  gpointer value;
+  gchar number[G_ASCII_DTOSTR_BUF_SIZE];
+  guint i;
+
+  pads = g_ptr_array_new_with_free_func (stats_unref);
+  elements = g_ptr_array_new_with_free_func (stats_unref);
+  queue_stats = g_ptr_array_new_with_free_func (stats_unref);
+  queues = g_ptr_array_new_with_free_func (gst_object_unref);
+
+  /* the references keep the stats valid after the registration lock has been
+   * released, even if their object goes away meanwhile */
+  g_mutex_lock (&registry->lock);
+  g_hash_table_iter_init (&iter, registry->pads);
+  while (g_hash_table_iter_next (&iter, NULL, &value))
+    g_ptr_array_add (pads, stats_ref (value));
+  g_hash_table_iter_init (&iter, registry->elements);
+  while (g_hash_table_iter_next (&iter, NULL, &value))
+    g_ptr_array_add (elements, stats_ref (value));
+  g_mutex_unlock (&registry->lock);
+
+  append_family (out, "gst_pad_buffers", "counter", NULL,
+      "Buffers pushed through the pad.");
+  for (i = 0; i < pads->len; i++) {
+    PadStats *stats = g_ptr_array_index (pads, i);
+
+    append_pad_sample (out, "gst_pad_buffers_total", stats,
+        counter_get (&stats->buffers));
+  }
+
+  append_family (out, "gst_pad_bytes", "counter", "bytes",
+      "Bytes pushed through the pad.");
+  for (i = 0; i < pads->len; i++) {
+    PadStats *stats = g_ptr_array_index (pads, i);
+
+    append_pad_sample (out, "gst_pad_bytes_total", stats,
+        counter_get (&stats->bytes));
+  }
+
+  append_family (out, "gst_element_processed_buffers", "counter", NULL,
+      "Buffers processed by the element.");
+  for (i = 0; i < elements->len; i++) {
+    ElementStats *stats = g_ptr_array_index (elements, i);
+
+    g_snprintf (number, sizeof (number), "%" G_GUINT64_FORMAT,
+        counter_get (&stats->processed));
+    append_element_sample (out, "gst_element_processed_buffers_total", stats,
+        number);
+  }
+
+  append_family (out, "gst_element_processing_seconds", "counter", "seconds",
+      "Time spent by the element handling buffers, excluding its own pushes "
+      "downstream.");
+  for (i = 0; i < elements->len; i++) {
+    ElementStats *stats = g_ptr_array_index (elements, i);
+
+    g_ascii_dtostr (number, sizeof (number),
+        counter_get (&stats->processing_ns) / (gdouble) GST_SECOND);
+    append_element_sample (out, "gst_element_processing_seconds_total", stats,
+        number);
+  }
+
+  append_family (out, "gst_element_latency_seconds", "gauge", "seconds",
+      "Minimum latency reported by the last latency query.");
+  for (i = 0; i < elements->len; i++) {
+    ElementStats *stats = g_ptr_array_index (elements, i);
+    GstElement *queue;
+
+    g_ascii_dtostr (number, sizeof (number),
+        counter_get (&stats->latency_ns) / (gdouble) GST_SECOND);
+    append_element_sample (out, "gst_element_latency_seconds", stats, number);
+
+    if (stats->is_queue && (queue = g_weak_ref_get (&stats->queue))) {
+      g_ptr_array_add (queue_stats, stats_ref (stats));
+      g_ptr_array_add (queues, queue);
+    }
+  }
+
+  /* reading the levels takes the queue locks, never do it with our lock */
+  append_family (out, "gst_queue_level_buffers", "gauge", NULL,
+      "Buffers currently held by the queue.");
+  for (i = 0; i < queues->len; i++) {
+    guint buffers;
+
+    g_object_get (g_ptr_array_index (queues, i), "current-level-buffers",
+        &buffers, NULL);
+    g_snprintf (number, sizeof (number), "%u", buffers);
+    append_element_sample (out, "gst_queue_level_buffers",
+        g_ptr_array_index (queue_stats, i), number);
+  }
+
+  append_family (out, "gst_queue_level_bytes", "gauge", "bytes",
+      "Bytes currently held by the queue.");
+  for (i = 0; i < queues->len; i++) {
+    guint bytes;
+
+    g_object_get (g_ptr_array_index (queues, i), "current-level-bytes",
+        &bytes, NULL);
+    g_snprintf (number, sizeof (number), "%u", bytes);
+    append_element_sample (out, "gst_queue_level_bytes",
+        g_ptr_array_index (queue_stats, i), number);
+  }
+
+  append_family (out, "gst_queue_level_seconds", "gauge", "seconds",
+      "Duration of the data currently held by the queue.");
+  for (i = 0; i < queues->len; i++) {
+    guint64 time;
+
+    g_object_get (g_ptr_array_index (queues, i), "current-level-time", &time,
+        NULL);
+    g_ascii_dtostr (number, sizeof (number), time / (gdouble) GST_SECOND);
+    append_element_sample (out, "gst_queue_level_seconds",
+        g_ptr_array_index (queue_stats, i), number);
+  }
+
+  g_string_append (out, "# EOF\n");
+
+  g_ptr_array_unref (queues);
+  g_ptr_array_unref (queue_stats);
+  g_ptr_array_unref (elements);
+  g_ptr_array_unref (pads);
+
+  return g_string_free (out, FALSE);
+}
+
+/* exporters */
+
+static gboolean
+write_metrics_file (gpointer user_data)
+{
+  GstMetricsTracer *self = GST_METRICS_TRACER (user_data);
+  gchar *metrics = registry_render (self->registry);
+  GError *err = NULL;
+
+  if (!g_file_set_contents (self->file, metrics, -1, &err)) {
+    GST_WARNING_OBJECT (self, "failed to write %s: %s", self->file,
+        err->message);
+    g_clear_error (&err);
+  }
+  g_free (metrics);
+
+  return G_SOURCE_CONTINUE;
+}
+
+static gboolean
+handle_scrape (GThreadedSocketService * service,
+    GSocketConnection * connection, GObject * source_object,
+    gpointer user_data)
+{
+  Registry *registry = user_data;
+  GInputStream *in = g_io_stream_get_input_stream (G_IO_STREAM (connection));
+  GOutputStream *out =
+      g_io_stream_get_output_stream (G_IO_STREAM (connection));
+  gchar request[2048];
+  gsize len = 0;
+  gssize n;
+  gchar *metrics;
+  GString *response;
+
+  g_socket_set_timeout (g_socket_connection_get_socket (connection), 5);
+
+  /* consume the request headers, any path is answered with the metrics */
+  while (len < sizeof (request) - 1) {
+    n = g_input_stream_read (in, request + len, sizeof (request) - 1 - len,
+        NULL, NULL);
+    if (n <= 0)
+      break;
+    len += n;
+    request[len] = '\0';
+    if (strstr (request, "\r\n\r\n") || strstr (request, "\n\n"))
+      break;
+  }
+
+  metrics = registry_render (registry);
+  response = g_string_new (NULL);
+  g_string_append_printf (response,
+      "HTTP/1.0 200 OK\r\n"
+      "Content-Type: " OPENMETRICS_CONTENT_TYPE "\r\n"
+      "Content-Length: %" G_GSIZE_FORMAT "\r\n"
+      "Connection: close\r\n\r\n", strlen (metrics));
+  g_string_append (response, metrics);
+  g_output_stream_write_all (out, response->str, response->len, NULL, NULL,
+      NULL);
+  g_io_stream_close (G_IO_STREAM (connection), NULL, NULL);
+
+  g_string_free (response, TRUE);
+  g_free (metrics);
+
+  return TRUE;
+}
+
+static gboolean
+start_socket_service (GstMetricsTracer * self)
+{
+  GSocketAddress *address;
+  GError *err = NULL;
+  gboolean ret;
+
+  if (self->socket_path) {
+    g_unlink (self->socket_path);
+    address = g_unix_socket_address_new (self->socket_path);
+  } else {
+    GInetAddress *loopback = g_inet_address_new_loopback (G_SOCKET_FAMILY_IPV4);
+
+    address = g_inet_socket_address_new (loopback, self->port);
+    g_object_unref (loopback);
+  }
+
+  self->service = g_threaded_socket_service_new (2);
+  ret = g_socket_listener_add_address (G_SOCKET_LISTENER (self->service),
+      address, G_SOCKET_TYPE_STREAM, G_SOCKET_PROTOCOL_DEFAULT, NULL, NULL,
+      &err);
+  g_object_unref (address);
+
+  if (!ret) {
+    GST_ERROR_OBJECT (self, "failed to listen on %s: %s",
+        self->socket_path ? self->socket_path : "localhost", err->message);
+    g_clear_error (&err);
+    g_clear_object (&self->service);
+    return FALSE;
+  }
+
+  /* the handler holds its own registry reference, the closure keeps it alive
+   * while a scrape runs even after the handler has been disconnected */
+  self->run_handler = g_signal_connect_data (self->service, "run",
+      G_CALLBACK (handle_scrape), g_atomic_rc_box_acquire (self->registry),
+      (GClosureNotify) registry_unref, 0);
+  g_socket_service_start (self->service);
+  return TRUE;
+}
+
+static gpointer
+exporter_thread (gpointer user_data)
+{
+  GstMetricsTracer *self = GST_METRICS_TRACER (user_data);
+
+  g_main_context_push_thread_default (self->context);
+  g_main_loop_run (self->loop);
+  g_main_context_pop_thread_default (self->context);
+
+  return NULL;
+}
+
+/* tracer */
+
+static void
+gst_metrics_tracer_parse_params (GstMetricsTracer * self)
+{
+  gchar *params, *tmp;
+  GstStructure *params_struct = NULL;
+  const gchar *value;
+
+  g_object_get (self, "params", &params, NULL);
+  if (!params)
+    return;
+
+  tmp = g_strdup_printf ("openmetrics,%s", params);
+  params_struct = gst_structure_from_string (tmp, NULL);
+  g_free (tmp);
+
+  if (!params_struct) {
+    GST_WARNING_OBJECT (self, "failed to parse params '%s'", params);
+    g_free (params);
+    return;
+  }
+
+  if ((value = gst_structure_get_string (params_struct, "file")))
+    self->file = g_strdup (value);
+  if ((value = gst_structure_get_string (params_struct, "socket")))
+    self->socket_path = g_strdup (value);
+  gst_structure_get_int (params_struct, "port", &self->port);
+  gst_structure_get_int (params_struct, "interval", &self->interval);
+
+  gst_structure_free (params_struct);
+  g_free (params);
+}
+
+static void
+gst_metrics_tracer_constructed (GObject * object)
+{
+  GstMetricsTracer *self = GST_METRICS_TRACER (object);
+
+  G_OBJECT_CLASS (gst_metrics_tracer_parent_class)->constructed (object);
+
+  gst_metrics_tracer_parse_params (self);
+  if (!self->file && !self->socket_path && self->port <= 0) {
+    gchar *basename = g_strdup_printf ("gst-metrics-%lu.prom",
+        (gulong) getpid ());
+
+    self->file = g_build_filename (g_get_tmp_dir (), basename, NULL);
+    g_free (basename);
+  }
+  if (self->interval <= 0)
+    self->interval = DEFAULT_INTERVAL_MS;
+
+  self->context = g_main_context_new ();
+  self->loop = g_main_loop_new (self->context, FALSE);
+
+  g_main_context_push_thread_default (self->context);
+  if (self->socket_path || self->port > 0)
+    start_socket_service (self);
+  if (self->file) {
+    GSource *source = g_timeout_source_new (self->interval);
+
+    g_source_set_callback (source, write_metrics_file, self, NULL);
+    g_source_attach (source, self->context);
+    g_source_unref (source);
+  }
+  g_main_context_pop_thread_default (self->context);
+
+  self->thread = g_thread_new ("metrics-exporter", exporter_thread, self);
+}
+
+static void
+gst_metrics_tracer_finalize (GObject * object)
+{
+  GstMetricsTracer *self = GST_METRICS_TRACER (object);
+
+  if (self->service) {
+    g_signal_handler_disconnect (self->service, self->run_handler);
+    g_socket_service_stop (self->service);
+    g_socket_listener_close (G_SOCKET_LISTENER (self->service));
+  }
+  g_main_loop_quit (self->loop);
+  g_thread_join (self->thread);
+  g_clear_object (&self->service);
+  g_main_loop_unref (self->loop);
+  g_main_context_unref (self->context);
+
+  /* flush the final values */
+  if (self->file)
+    write_metrics_file (self);
+  if (self->socket_path)
+    g_unlink (self->socket_path);
+
+  /* stats of objects still alive are released with their object */
+  g_mutex_lock (&self->registry->lock);
+  g_hash_table_remove_all (self->registry->pads);
+  g_hash_table_remove_all (self->registry->elements);
+  g_mutex_unlock (&self->registry->lock);
+  registry_unref (self->registry);
+  g_free (self->file);
+  g_free (self->socket_path);
+
+  G_OBJECT_CLASS (gst_metrics_tracer_parent_class)->finalize (object);
+}
+
+static void
+gst_metrics_tracer_class_init (GstMetricsTracerClass * klass)
+{
+  GObjectClass *gobject_class = G_OBJECT_CLASS (klass);
+
+  gobject_class->constructed = gst_metrics_tracer_constructed;
+  gobject_class->finalize = gst_metrics_tracer_finalize;
+
+  stats_quark = g_quark_from_static_string ("gst-metrics-tracer-stats");
+}
+
+static void
+gst_metrics_tracer_init (GstMetricsTracer * self)
+{
+  GstTracer *tracer = GST_TRACER (self);
+
+  self->registry = registry_new ();
+
+  gst_tracing_register_hook (tracer, "pad-push-pre",
+      G_CALLBACK (do_push_buffer_pre));
+  gst_tracing_register_hook (tracer, "pad-push-list-pre",
+      G_CALLBACK (do_push_buffer_list_pre));
+  gst_tracing_register_hook (tracer, "pad-push-post",
+      G_CALLBACK (do_push_post));
+  gst_tracing_register_hook (tracer, "pad-push-list-post",
+      G_CALLBACK (do_push_post));
+  gst_tracing_register_hook (tracer, "element-query-post",
+      G_CALLBACK (do_element_query_post));
+}
+
+static gboolean
+plugin_init (GstPlugin * plugin)
+{
+  GST_DEBUG_CATEGORY_INIT (gst_metrics_tracer_debug, "metricstracer", 0,
+      "OpenMetrics exporting tracer");
+
+  return gst_tracer_register (plugin, "openmetrics", GST_TYPE_METRICS_TRACER);
+}
+
+GST_PLUGIN_DEFINE (GST_VERSION_MAJOR, GST_VERSION_MINOR, metricstracer,
+    "OpenMetrics exporting tracer", plugin_init, VERSION, "LGPL", PACKAGE,
+    "https://github.com/TUM-CONAN/conan-gstreamer");
@@ -0,0 +1,72 @@
+#ifndef TEST_PACKAGE_BENCHMARK_H
+#define TEST_PACKAGE_BENCHMARK_H
+
+#include <gst/gst.h>
+
+#ifdef G_OS_WIN32
+#include <windows.h>
+#else
+#include <sys/resource.h>
+#endif
+
+/* wall clock in seconds */
+static inline double bench_now(void)
+{
+    return g_get_monotonic_time() / (double) G_USEC_PER_SEC;
+}
+
+/* user + system CPU time of the whole process in seconds */
+static inline double bench_cpu_time(void)
+{
+#ifdef G_OS_WIN32
+    FILETIME creation, exit, kernel, user;
+    ULARGE_INTEGER k, u;
+    GetProcessTimes(GetCurrentProcess(), &creation, &exit, &kernel, &user);
+    k.LowPart = kernel.dwLowDateTime;
+    k.HighPart = kernel.dwHighDateTime;
+    u.LowPart = user.dwLowDateTime;
+    u.HighPart = user.dwHighDateTime;
+    return (k.QuadPart + u.QuadPart) / 1e7;
+#else
+    struct rusage usage;
+    getrusage(RUSAGE_SELF, &usage);
+    return usage.ru_utime.tv_sec + usage.ru_utime.tv_usec / 1e6 +
+        usage.ru_stime.tv_sec + usage.ru_stime.tv_usec / 1e6;
+#endif
+}
+
+static inline gboolean bench_has_element(const char * factory)
+{
+    GstElementFactory * f = gst_element_factory_find(factory);
+    if (!f)
+        return FALSE;
+    gst_object_unref(f);
+    return TRUE;
+}
+
+/* runs the pipeline until EOS, returns FALSE on error or timeout */
+static inline gboolean bench_run_to_eos(GstElement * pipeline, GstClockTime timeout)
+{
+    GstBus * bus = gst_element_get_bus(pipeline);
+    GstMessage * msg;
+    gboolean ret;
+
+    if (gst_element_set_state(pipeline, GST_STATE_PLAYING) == GST_STATE_CHANGE_FAILURE) {
+        gst_object_unref(bus);
+        return FALSE;
+    }
+    msg = gst_bus_timed_pop_filtered(bus, timeout, GST_MESSAGE_EOS | GST_MESSAGE_ERROR);
+    ret = msg && GST_MESSAGE_TYPE(msg) == GST_MESSAGE_EOS;
+    if (msg && GST_MESSAGE_TYPE(msg) == GST_MESSAGE_ERROR) {
+        GError * err = NULL;
+        gst_message_parse_error(msg, &err, NULL);
+        g_printerr("%s: %s\n", GST_OBJECT_NAME(GST_MESSAGE_SRC(msg)), err->message);
+        g_clear_error(&err);
+    }
+    if (msg)
+        gst_message_unref(msg);
+    gst_object_unref(bus);
+    return ret;
+}
+
+#endif /* TEST_PACKAGE_BENCHMARK_H */
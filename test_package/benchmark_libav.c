@@ -0,0 +1,285 @@
+/* gst-libav decode throughput over bitstreams encoded at test time, with the
+ * decoder threads pinned to one and left to FFmpeg, printed as JSON; H.264 and
+ * HEVC are encoded with libx264/libx265 through the libavcodec gst-libav links */
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <gst/gst.h>
+#include <gst/app/gstappsrc.h>
+#include <gst/app/gstappsink.h>
+#include <libavcodec/avcodec.h>
+#include <libavutil/opt.h>
+
+#include "benchmark.h"
+
+#ifdef GST_STATIC_COMPILATION
+GST_PLUGIN_STATIC_DECLARE(app);
+GST_PLUGIN_STATIC_DECLARE(audioconvert);
+GST_PLUGIN_STATIC_DECLARE(audiotestsrc);
+GST_PLUGIN_STATIC_DECLARE(coreelements);
+GST_PLUGIN_STATIC_DECLARE(libav);
+GST_PLUGIN_STATIC_DECLARE(videotestsrc);
+#endif
+
+#define VIDEO_SOURCE "videotestsrc pattern=ball num-buffers=%d ! video/x-raw,format=I420,width=1920,height=1080,framerate=30/1"
+#define AUDIO_SOURCE "audiotestsrc wave=pink-noise num-buffers=%d samplesperbuffer=1024 ! audio/x-raw,rate=48000,channels=2 ! audioconvert"
+
+#define WIDTH 1920
+#define HEIGHT 1080
+#define FPS 30
+#define BITRATE 8000000
+
+typedef struct {
+    const char * codec;
+    /* encoded by a GStreamer pipeline from source ... */
+    const char * source;
+    const char * encoder;
+    /* ... or by this libavcodec encoder, producing these caps */
+    const char * av_encoder;
+    const char * caps;
+    const char * decoder;
+} Codec;
+
+static const Codec codecs[] = {
+    { "h264", NULL, NULL, "libx264", "video/x-h264,stream-format=byte-stream,alignment=au", "avdec_h264" },
+    { "h265", NULL, NULL, "libx265", "video/x-h265,stream-format=byte-stream,alignment=au", "avdec_h265" },
+    { "mpeg4", VIDEO_SOURCE, "avenc_mpeg4 bitrate=8000000", NULL, NULL, "avdec_mpeg4" },
+    { "mpeg2video", VIDEO_SOURCE, "avenc_mpeg2video bitrate=8000000", NULL, NULL, "avdec_mpeg2video" },
+    { "aac", AUDIO_SOURCE, "avenc_aac bitrate=128000", NULL, NULL, "avdec_aac" },
+};
+
+typedef struct {
+    GstCaps * caps;
+    GPtrArray * buffers;
+    guint64 bytes;
+} Bitstream;
+
+static gboolean has_encoder(const Codec * codec)
+{
+    char * factory;
+    gboolean found;
+
+    if (codec->av_encoder)
+        return avcodec_find_encoder_by_name(codec->av_encoder) != NULL;
+    factory = g_strndup(codec->encoder, strcspn(codec->encoder, " "));
+    found = bench_has_element(factory);
+    g_free(factory);
+    return found;
+}
+
+/* a gradient moving right and down, one pixel per frame */
+static void fill_frame(AVFrame * frame, int index)
+{
+    int x, y;
+    for (y = 0; y < HEIGHT; y++)
+        for (x = 0; x < WIDTH; x++)
+            frame->data[0][y * frame->linesize[0] + x] = x + y + index;
+    for (y = 0; y < HEIGHT / 2; y++) {
+        for (x = 0; x < WIDTH / 2; x++) {
+            frame->data[1][y * frame->linesize[1] + x] = 128 + x / 4 - index;
+            frame->data[2][y * frame->linesize[2] + x] = 128 + y / 4 + index;
+        }
+    }
+}
+
+/* NULL frame drains the encoder */
+static gboolean receive_packets(AVCodecContext * context, const AVFrame * frame, AVPacket * packet, Bitstream * bitstream)
+{
+    int ret = avcodec_send_frame(context, frame);
+    if (ret < 0)
+        return FALSE;
+    while ((ret = avcodec_receive_packet(context, packet)) >= 0) {
+        GstBuffer * buffer = gst_buffer_new_memdup(packet->data, packet->size);
+        GST_BUFFER_PTS(buffer) = gst_util_uint64_scale(packet->pts, GST_SECOND, FPS);
+        GST_BUFFER_DURATION(buffer) = GST_SECOND / FPS;
+        bitstream->bytes += packet->size;
+        g_ptr_array_add(bitstream->buffers, buffer);
+        av_packet_unref(packet);
+    }
+    return ret == AVERROR(EAGAIN) || ret == AVERROR_EOF;
+}
+
+/* Annex-B access units with in-band parameter sets, what avdec_h264/avdec_h265 take without a parser */
+static gboolean encode_libavcodec(const Codec * codec, int frames, Bitstream * bitstream)
+{
+    const AVCodec * encoder = avcodec_find_encoder_by_name(codec->av_encoder);
+    AVCodecContext * context = avcodec_alloc_context3(encoder);
+    AVFrame * frame = av_frame_alloc();
+    AVPacket * packet = av_packet_alloc();
+    gboolean ok;
+    int i;
+
+    context->width = WIDTH;
+    context->height = HEIGHT;
+    context->pix_fmt = AV_PIX_FMT_YUV420P;
+    context->time_base = (AVRational) { 1, FPS };
+    context->framerate = (AVRational) { FPS, 1 };
+    context->bit_rate = BITRATE;
+    av_opt_set(context->priv_data, "preset", "ultrafast", 0);
+    frame->format = context->pix_fmt;
+    frame->width = WIDTH;
+    frame->height = HEIGHT;
+
+    ok = avcodec_open2(context, encoder, NULL) == 0 && av_frame_get_buffer(frame, 0) == 0;
+    for (i = 0; i < frames && ok; i++) {
+        ok = av_frame_make_writable(frame) == 0;
+        if (ok) {
+            fill_frame(frame, i);
+            frame->pts = i;
+            ok = receive_packets(context, frame, packet, bitstream);
+        }
+    }
+    if (ok)
+        ok = receive_packets(context, NULL, packet, bitstream);
+    if (ok)
+        bitstream->caps = gst_caps_from_string(codec->caps);
+
+    av_packet_free(&packet);
+    av_frame_free(&frame);
+    avcodec_free_context(&context);
+    return ok && bitstream->buffers->len > 0;
+}
+
+static gboolean encode(const Codec * codec, int frames, Bitstream * bitstream)
+{
+    char * source;
+    char * desc;
+    GstElement * pipeline;
+    GstElement * sink;
+    GstSample * sample;
+
+    bitstream->caps = NULL;
+    bitstream->buffers = g_ptr_array_new_with_free_func((GDestroyNotify) gst_buffer_unref);
+    bitstream->bytes = 0;
+    if (codec->av_encoder)
+        return encode_libavcodec(codec, frames, bitstream);
+
+    source = g_strdup_printf(codec->source, frames);
+    desc = g_strdup_printf("%s ! %s ! appsink name=sink sync=false", source, codec->encoder);
+    pipeline = gst_parse_launch(desc, NULL);
+    sink = gst_bin_get_by_name(GST_BIN(pipeline), "sink");
+
+    gst_element_set_state(pipeline, GST_STATE_PLAYING);
+    /* NULL on EOS, the timeout covers failing encoders */
+    while ((sample = gst_app_sink_try_pull_sample(GST_APP_SINK(sink), 30 * GST_SECOND))) {
+        GstBuffer * buffer = gst_sample_get_buffer(sample);
+        if (!bitstream->caps)
+            bitstream->caps = gst_caps_ref(gst_sample_get_caps(sample));
+        bitstream->bytes += gst_buffer_get_size(buffer);
+        g_ptr_array_add(bitstream->buffers, gst_buffer_ref(buffer));
+        gst_sample_unref(sample);
+    }
+    gst_element_set_state(pipeline, GST_STATE_NULL);
+
+    gst_object_unref(sink);
+    gst_object_unref(pipeline);
+    g_free(desc);
+    g_free(source);
+    return bitstream->caps && bitstream->buffers->len > 0;
+}
+
+static GstPadProbeReturn count_frame(GstPad * pad, GstPadProbeInfo * info, gpointer user_data)
+{
+    g_atomic_int_inc((gint *) user_data);
+    return GST_PAD_PROBE_OK;
+}
+
+/* max_threads 0 lets FFmpeg pick one thread per core */
+static gboolean decode(const Codec * codec, Bitstream * bitstream, int max_threads, gboolean first)
+{
+    char * desc = g_strdup_printf("appsrc name=src format=time ! %s name=decoder ! fakesink name=sink sync=false", codec->decoder);
+    GstElement * pipeline = gst_parse_launch(desc, NULL);
+    GstElement * src = gst_bin_get_by_name(GST_BIN(pipeline), "src");
+    GstElement * decoder = gst_bin_get_by_name(GST_BIN(pipeline), "decoder");
+    GstElement * sink = gst_bin_get_by_name(GST_BIN(pipeline), "sink");
+    GstPad * pad = gst_element_get_static_pad(sink, "sink");
+    GstBus * bus = gst_element_get_bus(pipeline);
+    GstMessage * msg;
+    gint decoded = 0;
+    double start, cpu_start, elapsed, cpu;
+    gboolean ok;
+    guint i;
+
+    g_object_set(src, "caps", bitstream->caps, "block", TRUE, NULL);
+    if (g_object_class_find_property(G_OBJECT_GET_CLASS(decoder), "max-threads"))
+        g_object_set(decoder, "max-threads", max_threads, NULL);
+    gst_pad_add_probe(pad, GST_PAD_PROBE_TYPE_BUFFER, count_frame, &decoded, NULL);
+
+    start = bench_now();
+    cpu_start = bench_cpu_time();
+    gst_element_set_state(pipeline, GST_STATE_PLAYING);
+    for (i = 0; i < bitstream->buffers->len; i++)
+        gst_app_src_push_buffer(GST_APP_SRC(src), gst_buffer_ref(g_ptr_array_index(bitstream->buffers, i)));
+    gst_app_src_end_of_stream(GST_APP_SRC(src));
+    msg = gst_bus_timed_pop_filtered(bus, 300 * GST_SECOND, GST_MESSAGE_EOS | GST_MESSAGE_ERROR);
+    elapsed = bench_now() - start;
+    cpu = bench_cpu_time() - cpu_start;
+    ok = msg && GST_MESSAGE_TYPE(msg) == GST_MESSAGE_EOS;
+
+    if (ok) {
+        printf("%s        {\"max_threads\": %d, \"frames\": %d, \"frames_per_second\": %.2f, "
+            "\"megabytes_per_second\": %.3f, \"cpu_seconds\": %.3f}",
+            first ? "" : ",\n", max_threads, g_atomic_int_get(&decoded), g_atomic_int_get(&decoded) / elapsed,
+            bitstream->bytes / elapsed / 1e6, cpu);
+    }
+
+    if (msg)
+        gst_message_unref(msg);
+    gst_element_set_state(pipeline, GST_STATE_NULL);
+    gst_object_unref(bus);
+    gst_object_unref(pad);
+    gst_object_unref(sink);
+    gst_object_unref(decoder);
+    gst_object_unref(src);
+    gst_object_unref(pipeline);
+    g_free(desc);
+    return ok;
+}
+
+int main(int argc, char * argv[])
+{
+    int frames = argc > 1 ? atoi(argv[1]) : 600;
+    gboolean ok = TRUE;
+    guint i;
+
+    gst_init(&argc, &argv);
+    av_log_set_level(AV_LOG_ERROR);
+
+#ifdef GST_STATIC_COMPILATION
+    GST_PLUGIN_STATIC_REGISTER(app);
+    GST_PLUGIN_STATIC_REGISTER(audioconvert);
+    GST_PLUGIN_STATIC_REGISTER(audiotestsrc);
+    GST_PLUGIN_STATIC_REGISTER(coreelements);
+    GST_PLUGIN_STATIC_REGISTER(libav);
+    GST_PLUGIN_STATIC_REGISTER(videotestsrc);
+#endif
+
+    printf("{\n  \"frames\": %d,\n  \"codecs\": [\n", frames);
+    for (i = 0; i < G_N_ELEMENTS(codecs); i++) {
+        const Codec * codec = &codecs[i];
+        gboolean encoder = has_encoder(codec);
+        Bitstream bitstream;
+        gboolean decoded;
+
+        printf("%s    {\"codec\": \"%s\", \"decoder\": \"%s\"", i ? ",\n" : "", codec->codec, codec->decoder);
+        if (!encoder || !bench_has_element(codec->decoder)) {
+            printf(", \"skipped\": \"%s not available\"}", encoder ? "decoder" : "encoder");
+            continue;
+        }
+        if (!encode(codec, frames, &bitstream)) {
+            printf(", \"skipped\": \"encoding failed\"}");
+            ok = FALSE;
+        } else {
+            printf(", \"bitstream_bytes\": %" G_GUINT64_FORMAT ", \"results\": [\n", bitstream.bytes);
+            decoded = decode(codec, &bitstream, 1, TRUE);
+            ok &= decoded;
+            ok &= decode(codec, &bitstream, 0, !decoded);
+            printf("\n      ]}");
+        }
+        gst_clear_caps(&bitstream.caps);
+        g_ptr_array_unref(bitstream.buffers);
+    }
+    printf("\n  ]\n}\n");
+
+    return ok ? EXIT_SUCCESS : EXIT_FAILURE;
+}
@@ -0,0 +1,263 @@
+/* multi-core scaling of videoconvertscale, compositor and audiomixer:
+ * sweeps the element worker threads and the number of concurrent pipelines
+ * from 1 to all cores and prints frames/s and parallel efficiency as JSON */
+#include <stdlib.h>
+#include <stdio.h>
+#include <gst/gst.h>
+#include <gst/app/gstappsrc.h>
+
+#include "benchmark.h"
+
+#ifdef GST_STATIC_COMPILATION
+GST_PLUGIN_STATIC_DECLARE(app);
+GST_PLUGIN_STATIC_DECLARE(audiomixer);
+GST_PLUGIN_STATIC_DECLARE(compositor);
+GST_PLUGIN_STATIC_DECLARE(coreelements);
+GST_PLUGIN_STATIC_DECLARE(videoconvertscale);
+#endif
+
+#define AUDIO_RATE 48000
+#define AUDIO_SAMPLES 1024
+#define MAX_SOURCES 2
+
+typedef struct {
+    const char * name;
+    int width;
+    int height;
+} Resolution;
+
+static const Resolution resolutions[] = {
+    { "720p", 1280, 720 },
+    { "1080p", 1920, 1080 },
+    { "2160p", 3840, 2160 },
+};
+
+typedef enum {
+    WORKLOAD_VIDEOCONVERTSCALE,
+    WORKLOAD_COMPOSITOR,
+    WORKLOAD_AUDIOMIXER,
+} Workload;
+
+static const char * workload_names[] = { "videoconvertscale", "compositor", "audiomixer" };
+
+typedef struct {
+    GstBuffer * buffer;
+    GstClockTime duration;
+    guint64 pushed;
+    guint64 total;
+} Feeder;
+
+typedef struct {
+    GstElement * pipeline;
+    Feeder feeders[MAX_SOURCES];
+} Instance;
+
+static void feed(GstAppSrc * appsrc, guint length, gpointer user_data)
+{
+    Feeder * feeder = user_data;
+    GstBuffer * buffer;
+
+    if (feeder->pushed >= feeder->total) {
+        if (feeder->pushed++ == feeder->total)
+            gst_app_src_end_of_stream(appsrc);
+        return;
+    }
+    /* shallow copy, only the timestamps differ between the pushed buffers */
+    buffer = gst_buffer_copy(feeder->buffer);
+    GST_BUFFER_PTS(buffer) = feeder->pushed * feeder->duration;
+    GST_BUFFER_DURATION(buffer) = feeder->duration;
+    feeder->pushed++;
+    gst_app_src_push_buffer(appsrc, buffer);
+}
+
+static char * pipeline_description(Workload workload, const Resolution * resolution)
+{
+    switch (workload) {
+    case WORKLOAD_VIDEOCONVERTSCALE:
+        return g_strdup_printf(
+            "appsrc name=src0 ! videoconvertscale name=worker ! video/x-raw,format=BGRA,width=%d,height=%d ! fakesink sync=false",
+            resolution->width / 2, resolution->height / 2);
+    case WORKLOAD_COMPOSITOR:
+        return g_strdup_printf(
+            "compositor name=worker sink_1::xpos=%d sink_1::ypos=%d ! video/x-raw,format=I420 ! fakesink sync=false "
+            "appsrc name=src0 ! worker.sink_0 appsrc name=src1 ! worker.sink_1",
+            resolution->width / 2, resolution->height / 2);
+    case WORKLOAD_AUDIOMIXER:
+    default:
+        return g_strdup("audiomixer name=worker ! fakesink sync=false "
+            "appsrc name=src0 ! worker.sink_0 appsrc name=src1 ! worker.sink_1");
+    }
+}
+
+/* the second compositor input is a quarter-size overlay */
+static void setup_source(GstElement * appsrc, Feeder * feeder, Workload workload, const Resolution * resolution, int index, guint64 frames)
+{
+    static const GstAppSrcCallbacks callbacks = { feed, NULL, NULL };
+    GstCaps * caps;
+    gsize size;
+
+    if (workload == WORKLOAD_AUDIOMIXER) {
+        caps = gst_caps_new_simple("audio/x-raw",
+            "format", G_TYPE_STRING, "F32LE", "layout", G_TYPE_STRING, "interleaved",
+            "rate", G_TYPE_INT, AUDIO_RATE, "channels", G_TYPE_INT, 2, NULL);
+        size = AUDIO_SAMPLES * 2 * sizeof(float);
+        feeder->duration = gst_util_uint64_scale_int(AUDIO_SAMPLES, GST_SECOND, AUDIO_RATE);
+    } else {
+        int width = index ? resolution->width / 2 : resolution->width;
+        int height = index ? resolution->height / 2 : resolution->height;
+        caps = gst_caps_new_simple("video/x-raw",
+            "format", G_TYPE_STRING, "I420", "width", G_TYPE_INT, width, "height", G_TYPE_INT, height,
+            "framerate", GST_TYPE_FRACTION, 30, 1, NULL);
+        size = width * height * 3 / 2;
+        feeder->duration = GST_SECOND / 30;
+    }
+    feeder->buffer = gst_buffer_new_allocate(NULL, size, NULL);
+    gst_buffer_memset(feeder->buffer, 0, 0x40 + 0x40 * index, size);
+    feeder->pushed = 0;
+    feeder->total = frames;
+
+    g_object_set(appsrc, "caps", caps, "format", GST_FORMAT_TIME, NULL);
+    gst_app_src_set_callbacks(GST_APP_SRC(appsrc), &callbacks, feeder, NULL);
+    gst_caps_unref(caps);
+}
+
+static gboolean set_threads(GstElement * worker, int threads)
+{
+    const char * properties[] = { "n-threads", "max-threads", NULL };
+    int i;
+    for (i = 0; properties[i]; i++) {
+        if (g_object_class_find_property(G_OBJECT_GET_CLASS(worker), properties[i])) {
+            g_object_set(worker, properties[i], threads, NULL);
+            return TRUE;
+        }
+    }
+    return FALSE;
+}
+
+/* returns the aggregated output frames/s of all pipelines, or a negative value */
+static double run(Workload workload, const Resolution * resolution, int threads, int pipelines, guint64 frames)
+{
+    Instance * instances = g_new0(Instance, pipelines);
+    char * desc = pipeline_description(workload, resolution);
+    gboolean ok = TRUE;
+    double start, elapsed;
+    int i, j;
+
+    for (i = 0; i < pipelines; i++) {
+        GstElement * worker;
+        instances[i].pipeline = gst_parse_launch(desc, NULL);
+        worker = gst_bin_get_by_name(GST_BIN(instances[i].pipeline), "worker");
+        /* set explicitly, compositor defaults to one thread per core */
+        set_threads(worker, threads);
+        gst_object_unref(worker);
+        for (j = 0; j < MAX_SOURCES; j++) {
+            char name[8];
+            GstElement * appsrc;
+            g_snprintf(name, sizeof(name), "src%d", j);
+            appsrc = gst_bin_get_by_name(GST_BIN(instances[i].pipeline), name);
+            if (appsrc) {
+                setup_source(appsrc, &instances[i].feeders[j], workload, resolution, j, frames);
+                gst_object_unref(appsrc);
+            }
+        }
+    }
+
+    start = bench_now();
+    for (i = 0; i < pipelines; i++)
+        gst_element_set_state(instances[i].pipeline, GST_STATE_PLAYING);
+    for (i = 0; i < pipelines; i++)
+        ok &= bench_run_to_eos(instances[i].pipeline, 300 * GST_SECOND);
+    elapsed = bench_now() - start;
+
+    for (i = 0; i < pipelines; i++) {
+        gst_element_set_state(instances[i].pipeline, GST_STATE_NULL);
+        gst_object_unref(instances[i].pipeline);
+        for (j = 0; j < MAX_SOURCES; j++)
+            gst_clear_buffer(&instances[i].feeders[j].buffer);
+    }
+    g_free(instances);
+    g_free(desc);
+    return ok ? pipelines * frames / elapsed : -1.0;
+}
+
+static void print_result(Workload workload, const char * resolution, const char * sweep, int threads, int pipelines, double fps, double baseline)
+{
+    static int results = 0;
+    int workers = threads * pipelines;
+    printf("%s    {\"workload\": \"%s\", \"resolution\": \"%s\", \"sweep\": \"%s\", \"threads\": %d, \"pipelines\": %d, "
+        "\"frames_per_second\": %.2f, \"parallel_efficiency\": %.3f}",
+        results++ ? ",\n" : "", workload_names[workload], resolution, sweep, threads, pipelines,
+        fps, fps / (baseline * workers));
+}
+
+static gboolean sweep(Workload workload, const Resolution * resolution, const int * counts, guint64 frames)
+{
+    const char * name = resolution ? resolution->name : "48kHz-stereo";
+    gboolean threaded = FALSE;
+    double baseline, fps;
+    int i;
+
+    baseline = run(workload, resolution, 1, 1, frames);
+    if (baseline <= 0)
+        return FALSE;
+
+    if (workload != WORKLOAD_AUDIOMIXER) {
+        GstElement * worker = gst_element_factory_make(workload_names[workload], NULL);
+        threaded = worker && set_threads(worker, 1);
+        if (worker)
+            gst_object_unref(worker);
+    }
+
+    print_result(workload, name, "threads", 1, 1, baseline, baseline);
+    for (i = 1; counts[i] && threaded; i++) {
+        fps = run(workload, resolution, counts[i], 1, frames);
+        if (fps <= 0)
+            return FALSE;
+        print_result(workload, name, "threads", counts[i], 1, fps, baseline);
+    }
+    for (i = 1; counts[i]; i++) {
+        fps = run(workload, resolution, 1, counts[i], frames);
+        if (fps <= 0)
+            return FALSE;
+        print_result(workload, name, "pipelines", 1, counts[i], fps, baseline);
+    }
+    return TRUE;
+}
+
+int main(int argc, char * argv[])
+{
+    /* output frames per pipeline at 720p, scaled down with the frame size */
+    guint64 base_frames = argc > 1 ? g_ascii_strtoull(argv[1], NULL, 10) : 480;
+    int cpus = g_get_num_processors();
+    int * counts = g_new0(int, cpus + 2);
+    gboolean ok = TRUE;
+    int n = 0, c;
+    guint i;
+
+    gst_init(&argc, &argv);
+
+#ifdef GST_STATIC_COMPILATION
+    GST_PLUGIN_STATIC_REGISTER(app);
+    GST_PLUGIN_STATIC_REGISTER(audiomixer);
+    GST_PLUGIN_STATIC_REGISTER(compositor);
+    GST_PLUGIN_STATIC_REGISTER(coreelements);
+    GST_PLUGIN_STATIC_REGISTER(videoconvertscale);
+#endif
+
+    /* 1, 2, 4, ... and all cores, zero terminated */
+    for (c = 1; c < cpus; c *= 2)
+        counts[n++] = c;
+    counts[n] = cpus;
+
+    printf("{\n  \"cpus\": %d,\n  \"results\": [\n", cpus);
+    for (i = 0; i < G_N_ELEMENTS(resolutions) && ok; i++) {
+        guint64 frames = MAX(base_frames * 1280 * 720 / (resolutions[i].width * resolutions[i].height), 10);
+        ok &= sweep(WORKLOAD_VIDEOCONVERTSCALE, &resolutions[i], counts, frames);
+        ok &= sweep(WORKLOAD_COMPOSITOR, &resolutions[i], counts, frames);
+    }
+    ok = ok && sweep(WORKLOAD_AUDIOMIXER, NULL, counts, base_frames * 10);
+    printf("\n  ]\n}\n");
+
+    g_free(counts);
+    return ok ? EXIT_SUCCESS : EXIT_FAILURE;
+}
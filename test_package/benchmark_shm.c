@@ -0,0 +1,183 @@
+/* raw 4K frame throughput and CPU cost of shmsink/shmsrc against
+ * tcpserversink/tcpclientsrc on localhost, printed as JSON */
+#include <stdlib.h>
+#include <stdio.h>
+#include <gst/gst.h>
+#include <gst/app/gstappsrc.h>
+#include <glib/gstdio.h>
+
+#include "benchmark.h"
+
+#ifdef GST_STATIC_COMPILATION
+GST_PLUGIN_STATIC_DECLARE(app);
+GST_PLUGIN_STATIC_DECLARE(coreelements);
+GST_PLUGIN_STATIC_DECLARE(shm);
+GST_PLUGIN_STATIC_DECLARE(tcp);
+#endif
+
+#define WIDTH 3840
+#define HEIGHT 2160
+#define FRAME_SIZE (WIDTH * HEIGHT * 3 / 2)
+/* frames in flight between sender and receiver */
+#define WINDOW 4
+
+typedef struct {
+    GMutex lock;
+    GCond cond;
+    guint64 bytes;
+    double last;
+} Receiver;
+
+static GstPadProbeReturn count_bytes(GstPad * pad, GstPadProbeInfo * info, gpointer user_data)
+{
+    Receiver * receiver = user_data;
+    g_mutex_lock(&receiver->lock);
+    receiver->bytes += gst_buffer_get_size(GST_PAD_PROBE_INFO_BUFFER(info));
+    receiver->last = bench_now();
+    g_cond_signal(&receiver->cond);
+    g_mutex_unlock(&receiver->lock);
+    return GST_PAD_PROBE_OK;
+}
+
+static gboolean wait_for_frames(Receiver * receiver, guint64 frames, gint64 deadline)
+{
+    gboolean ret = TRUE;
+    g_mutex_lock(&receiver->lock);
+    while (receiver->bytes / FRAME_SIZE < frames && ret)
+        ret = g_cond_wait_until(&receiver->cond, &receiver->lock, deadline);
+    g_mutex_unlock(&receiver->lock);
+    return ret;
+}
+
+/* receiver_desc contains a %s which is replaced by the endpoint of the sender */
+static gboolean run_transport(const char * transport, const char * sender_desc, const char * receiver_desc, int frames)
+{
+    static int results = 0;
+    GstElement * sender, * receiver, * src, * sink, * fakesink;
+    GstBuffer * frame;
+    GstCaps * caps;
+    GstPad * pad;
+    Receiver counter;
+    char * endpoint;
+    char * desc;
+    double start, cpu_start, elapsed, cpu;
+    gint64 deadline;
+    gboolean ok = TRUE;
+    int i;
+
+    sender = gst_parse_launch(sender_desc, NULL);
+    src = gst_bin_get_by_name(GST_BIN(sender), "src");
+    sink = gst_bin_get_by_name(GST_BIN(sender), "sink");
+    caps = gst_caps_new_simple("video/x-raw",
+        "format", G_TYPE_STRING, "I420", "width", G_TYPE_INT, WIDTH, "height", G_TYPE_INT, HEIGHT,
+        "framerate", GST_TYPE_FRACTION, 0, 1, NULL);
+    g_object_set(src, "caps", caps, "format", GST_FORMAT_TIME, NULL);
+    gst_caps_unref(caps);
+
+    /* the sinks open their endpoint when going to PAUSED */
+    gst_element_set_state(sender, GST_STATE_PLAYING);
+    if (g_object_class_find_property(G_OBJECT_GET_CLASS(sink), "current-port")) {
+        int port = 0;
+        g_object_get(sink, "current-port", &port, NULL);
+        endpoint = g_strdup_printf("%d", port);
+    } else {
+        g_object_get(sink, "socket-path", &endpoint, NULL);
+    }
+
+    desc = g_strdup_printf(receiver_desc, endpoint);
+    receiver = gst_parse_launch(desc, NULL);
+    g_free(desc);
+    fakesink = gst_bin_get_by_name(GST_BIN(receiver), "sink");
+    pad = gst_element_get_static_pad(fakesink, "sink");
+    g_mutex_init(&counter.lock);
+    g_cond_init(&counter.cond);
+    counter.bytes = 0;
+    counter.last = 0;
+    gst_pad_add_probe(pad, GST_PAD_PROBE_TYPE_BUFFER, count_bytes, &counter, NULL);
+    gst_object_unref(pad);
+    gst_element_set_state(receiver, GST_STATE_PLAYING);
+
+    /* tcpserversink drops buffers while no client is connected */
+    if (g_object_class_find_property(G_OBJECT_GET_CLASS(sink), "num-handles")) {
+        int handles = 0;
+        deadline = g_get_monotonic_time() + 5 * G_TIME_SPAN_SECOND;
+        while (handles == 0 && g_get_monotonic_time() < deadline) {
+            g_usleep(10 * G_TIME_SPAN_MILLISECOND);
+            g_object_get(sink, "num-handles", &handles, NULL);
+        }
+    }
+
+    frame = gst_buffer_new_allocate(NULL, FRAME_SIZE, NULL);
+    gst_buffer_memset(frame, 0, 0x80, FRAME_SIZE);
+
+    deadline = g_get_monotonic_time() + 120 * G_TIME_SPAN_SECOND;
+    start = bench_now();
+    cpu_start = bench_cpu_time();
+    for (i = 0; i < frames && ok; i++) {
+        if (i >= WINDOW)
+            ok = wait_for_frames(&counter, i - WINDOW + 1, deadline);
+        gst_app_src_push_buffer(GST_APP_SRC(src), gst_buffer_ref(frame));
+    }
+    ok = ok && wait_for_frames(&counter, frames, deadline);
+    elapsed = counter.last - start;
+    cpu = bench_cpu_time() - cpu_start;
+
+    if (!ok) {
+        g_printerr("%s: only %" G_GUINT64_FORMAT " of %d frames received\n", transport, counter.bytes / FRAME_SIZE, frames);
+    } else {
+        printf("%s    {\"transport\": \"%s\", \"frames_per_second\": %.2f, \"megabytes_per_second\": %.2f, "
+            "\"cpu_seconds\": %.3f, \"cpu_percent\": %.1f}",
+            results++ ? ",\n" : "", transport, frames / elapsed, frames * (double) FRAME_SIZE / elapsed / 1e6,
+            cpu, 100.0 * cpu / elapsed);
+    }
+
+    gst_app_src_end_of_stream(GST_APP_SRC(src));
+    gst_element_set_state(receiver, GST_STATE_NULL);
+    gst_element_set_state(sender, GST_STATE_NULL);
+    gst_buffer_unref(frame);
+    gst_object_unref(fakesink);
+    gst_object_unref(receiver);
+    gst_object_unref(sink);
+    gst_object_unref(src);
+    gst_object_unref(sender);
+    g_mutex_clear(&counter.lock);
+    g_cond_clear(&counter.cond);
+    g_free(endpoint);
+    return ok;
+}
+
+int main(int argc, char * argv[])
+{
+    int frames = argc > 1 ? atoi(argv[1]) : 300;
+    char * tmpdir;
+    char * shm_sender;
+    gboolean ok;
+
+    gst_init(&argc, &argv);
+
+#ifdef GST_STATIC_COMPILATION
+    GST_PLUGIN_STATIC_REGISTER(app);
+    GST_PLUGIN_STATIC_REGISTER(coreelements);
+    GST_PLUGIN_STATIC_REGISTER(shm);
+    GST_PLUGIN_STATIC_REGISTER(tcp);
+#endif
+
+    tmpdir = g_dir_make_tmp("gst-shm-XXXXXX", NULL);
+    shm_sender = g_strdup_printf(
+        "appsrc name=src block=true ! shmsink name=sink socket-path=\"%s/frames\" shm-size=%d wait-for-connection=true sync=false",
+        tmpdir, (WINDOW + 2) * FRAME_SIZE);
+
+    printf("{\n  \"width\": %d,\n  \"height\": %d,\n  \"frame_size\": %d,\n  \"frames\": %d,\n  \"results\": [\n",
+        WIDTH, HEIGHT, FRAME_SIZE, frames);
+    ok = run_transport("shm", shm_sender,
+        "shmsrc socket-path=\"%s\" ! fakesink name=sink sync=false", frames);
+    ok &= run_transport("tcp",
+        "appsrc name=src block=true ! tcpserversink name=sink host=127.0.0.1 port=0 sync=false",
+        "tcpclientsrc host=127.0.0.1 port=%s blocksize=1048576 ! fakesink name=sink sync=false", frames);
+    printf("\n  ]\n}\n");
+
+    g_rmdir(tmpdir);
+    g_free(shm_sender);
+    g_free(tmpdir);
+    return ok ? EXIT_SUCCESS : EXIT_FAILURE;
+}
@@ -0,0 +1,240 @@
+/* CPU and thread count of N low-bitrate UDP streams received on localhost,
+ * udpsrc/queue (one thread per source and queue) against the gst-plugins-rs
+ * threadshare ts-udpsrc/ts-queue sharing one context per core, printed as JSON */
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <gst/gst.h>
+#include <gio/gio.h>
+
+#include "benchmark.h"
+
+#ifdef GST_STATIC_COMPILATION
+GST_PLUGIN_STATIC_DECLARE(coreelements);
+GST_PLUGIN_STATIC_DECLARE(threadshare);
+GST_PLUGIN_STATIC_DECLARE(udp);
+#endif
+
+/* 7 MPEG-TS packets every 20ms, ~0.5 Mbit/s per stream */
+#define PACKET_SIZE 1316
+#define PACKET_INTERVAL_MS 20
+/* ts-udpsrc and ts-queue wake up at most this often */
+#define CONTEXT_WAIT_MS 20
+
+typedef struct {
+    GThread * thread;
+    gint running;
+    int streams;
+    int base_port;
+} Sender;
+
+typedef struct {
+    const char * name;
+    const char * src;
+    const char * queue;
+    gboolean threadshare;
+} Variant;
+
+static const Variant variants[] = {
+    { "udpsrc/queue", "udpsrc", "queue", FALSE },
+    { "ts-udpsrc/ts-queue", "ts-udpsrc", "ts-queue", TRUE },
+};
+
+static gpointer send_packets(gpointer user_data)
+{
+    Sender * sender = user_data;
+    GSocket * socket = g_socket_new(G_SOCKET_FAMILY_IPV4, G_SOCKET_TYPE_DATAGRAM, G_SOCKET_PROTOCOL_UDP, NULL);
+    GInetAddress * localhost = g_inet_address_new_loopback(G_SOCKET_FAMILY_IPV4);
+    GSocketAddress ** addresses = g_new0(GSocketAddress *, sender->streams);
+    char packet[PACKET_SIZE];
+    gint64 next = g_get_monotonic_time();
+    int i;
+
+    memset(packet, 0x47, sizeof(packet));
+    for (i = 0; i < sender->streams; i++)
+        addresses[i] = g_inet_socket_address_new(localhost, sender->base_port + i);
+
+    while (g_atomic_int_get(&sender->running)) {
+        gint64 now;
+        for (i = 0; i < sender->streams; i++)
+            g_socket_send_to(socket, addresses[i], packet, sizeof(packet), NULL, NULL);
+        next += PACKET_INTERVAL_MS * 1000;
+        now = g_get_monotonic_time();
+        if (next > now)
+            g_usleep(next - now);
+    }
+
+    for (i = 0; i < sender->streams; i++)
+        g_object_unref(addresses[i]);
+    g_free(addresses);
+    g_object_unref(localhost);
+    g_object_unref(socket);
+    return NULL;
+}
+
+static void start_sender(Sender * sender, int streams, int base_port)
+{
+    sender->streams = streams;
+    sender->base_port = base_port;
+    sender->running = 1;
+    sender->thread = g_thread_new("udp-sender", send_packets, sender);
+}
+
+static void stop_sender(Sender * sender)
+{
+    g_atomic_int_set(&sender->running, 0);
+    g_thread_join(sender->thread);
+}
+
+/* -1 where the threads of the process cannot be listed */
+static int count_threads(void)
+{
+#ifdef __linux__
+    GDir * dir = g_dir_open("/proc/self/task", 0, NULL);
+    int threads = 0;
+    if (!dir)
+        return -1;
+    while (g_dir_read_name(dir))
+        threads++;
+    g_dir_close(dir);
+    return threads;
+#else
+    return -1;
+#endif
+}
+
+static GstPadProbeReturn count_packet(GstPad * pad, GstPadProbeInfo * info, gpointer user_data)
+{
+    g_atomic_int_inc((gint *) user_data);
+    return GST_PAD_PROBE_OK;
+}
+
+static void set_context(GstElement * element, int context)
+{
+    char * name = g_strdup_printf("ts-benchmark-%d", context);
+    g_object_set(element, "context", name, "context-wait", CONTEXT_WAIT_MS, NULL);
+    g_free(name);
+}
+
+static GstElement * build_pipeline(const Variant * variant, int streams, int base_port, int contexts, gint * received)
+{
+    GstElement * pipeline = gst_pipeline_new(NULL);
+    int i;
+
+    for (i = 0; i < streams; i++) {
+        GstElement * src = gst_element_factory_make(variant->src, NULL);
+        GstElement * queue = gst_element_factory_make(variant->queue, NULL);
+        GstElement * sink = gst_element_factory_make("fakesink", NULL);
+        GstPad * pad = gst_element_get_static_pad(sink, "sink");
+
+        g_object_set(src, "port", base_port + i, NULL);
+        if (g_object_class_find_property(G_OBJECT_GET_CLASS(src), "address"))
+            g_object_set(src, "address", "127.0.0.1", NULL);
+        if (variant->threadshare) {
+            set_context(src, i % contexts);
+            set_context(queue, i % contexts);
+        }
+        g_object_set(sink, "sync", FALSE, "async", FALSE, NULL);
+        gst_pad_add_probe(pad, GST_PAD_PROBE_TYPE_BUFFER, count_packet, received, NULL);
+        gst_object_unref(pad);
+
+        gst_bin_add_many(GST_BIN(pipeline), src, queue, sink, NULL);
+        gst_element_link_many(src, queue, sink, NULL);
+    }
+    return pipeline;
+}
+
+static gboolean run(const Variant * variant, int streams, int base_port, int seconds, int contexts)
+{
+    static int results = 0;
+    gint received = 0;
+    GstElement * pipeline;
+    double start, cpu_start, elapsed, cpu;
+    int before, threads;
+    GstStateChangeReturn ret;
+    gboolean ok;
+
+    printf("%s    {\"elements\": \"%s\"", results++ ? ",\n" : "", variant->name);
+    /* without both variants there is nothing to compare */
+    if (!bench_has_element(variant->src) || !bench_has_element(variant->queue)) {
+        printf(", \"skipped\": \"%s not available\"}", variant->src);
+        return FALSE;
+    }
+
+    before = count_threads();
+    pipeline = build_pipeline(variant, streams, base_port, contexts, &received);
+    gst_element_set_state(pipeline, GST_STATE_PLAYING);
+    /* live sources do not preroll */
+    ret = gst_element_get_state(pipeline, NULL, NULL, 10 * GST_SECOND);
+    ok = ret == GST_STATE_CHANGE_SUCCESS || ret == GST_STATE_CHANGE_NO_PREROLL;
+
+    if (ok) {
+        Sender sender;
+        gint packets;
+
+        start_sender(&sender, streams, base_port);
+        /* let the sockets and threads settle before measuring */
+        g_usleep(G_USEC_PER_SEC);
+        packets = g_atomic_int_get(&received);
+        start = bench_now();
+        cpu_start = bench_cpu_time();
+        g_usleep(seconds * G_USEC_PER_SEC);
+        threads = count_threads();
+        elapsed = bench_now() - start;
+        cpu = bench_cpu_time() - cpu_start;
+        packets = g_atomic_int_get(&received) - packets;
+        stop_sender(&sender);
+
+        if (variant->threadshare)
+            printf(", \"contexts\": %d", contexts);
+        printf(", \"threads\": %d, \"cpu_seconds\": %.3f, \"cpu_percent\": %.1f, "
+            "\"received_packets_per_second\": %.1f, \"loss_ratio\": %.4f}",
+            threads >= 0 && before >= 0 ? threads - before : -1, cpu, 100.0 * cpu / elapsed,
+            packets / elapsed,
+            MAX(0.0, 1.0 - packets / (elapsed * streams * 1000.0 / PACKET_INTERVAL_MS)));
+    } else {
+        printf(", \"skipped\": \"pipeline failed to start\"}");
+    }
+
+    gst_element_set_state(pipeline, GST_STATE_NULL);
+    gst_object_unref(pipeline);
+    return ok;
+}
+
+int main(int argc, char * argv[])
+{
+    int streams = argc > 1 ? atoi(argv[1]) : 500;
+    int seconds = argc > 2 ? atoi(argv[2]) : 10;
+    int base_port = argc > 3 ? atoi(argv[3]) : 40000;
+    int contexts = g_get_num_processors();
+    Sender sender;
+    double start, cpu_start, elapsed, sender_cpu;
+    gboolean ok = TRUE;
+    guint i;
+
+    gst_init(&argc, &argv);
+
+#ifdef GST_STATIC_COMPILATION
+    GST_PLUGIN_STATIC_REGISTER(coreelements);
+    GST_PLUGIN_STATIC_REGISTER(threadshare);
+    GST_PLUGIN_STATIC_REGISTER(udp);
+#endif
+
+    /* the sender runs in this process, its own cost is measured first */
+    start_sender(&sender, streams, base_port);
+    start = bench_now();
+    cpu_start = bench_cpu_time();
+    g_usleep(seconds * G_USEC_PER_SEC);
+    elapsed = bench_now() - start;
+    sender_cpu = bench_cpu_time() - cpu_start;
+    stop_sender(&sender);
+
+    printf("{\n  \"streams\": %d,\n  \"packet_size\": %d,\n  \"packets_per_stream_per_second\": %d,\n"
+        "  \"seconds\": %d,\n  \"sender_cpu_percent\": %.1f,\n  \"results\": [\n",
+        streams, PACKET_SIZE, 1000 / PACKET_INTERVAL_MS, seconds, 100.0 * sender_cpu / elapsed);
+    for (i = 0; i < G_N_ELEMENTS(variants); i++)
+        ok &= run(&variants[i], streams, base_port, seconds, contexts);
+    printf("\n  ]\n}\n");
+
+    return ok ? EXIT_SUCCESS : EXIT_FAILURE;
+}
@@ -0,0 +1,125 @@
+/* h264parse throughput over a locally generated 1080p H.264 Annex-B stream:
+ * sweeps slices per frame, input chunk size and output alignment, and prints
+ * MB/s and CPU time per NAL unit as JSON, with identity as the baseline cost
+ * of the pipeline around the parser
+ *
+ * usage: benchmark_videoparsers [stream megabytes] [bytes per frame] */
+#include <stdlib.h>
+#include <stdio.h>
+#include <gst/gst.h>
+#include <gst/app/gstappsrc.h>
+
+#include "benchmark.h"
+#include "h264_stream.h"
+
+#ifdef GST_STATIC_COMPILATION
+GST_PLUGIN_STATIC_DECLARE(app);
+GST_PLUGIN_STATIC_DECLARE(coreelements);
+GST_PLUGIN_STATIC_DECLARE(videoparsers);
+#endif
+
+static const int slice_counts[] = { 1, 8 };
+static const int chunk_sizes[] = { 4096, 65536, 1048576 };
+static const char * alignments[] = { "nal", "au" };
+
+static GstPadProbeReturn count_buffer(GstPad * pad, GstPadProbeInfo * info, gpointer user_data)
+{
+    g_atomic_int_inc((gint *) user_data);
+    return GST_PAD_PROBE_OK;
+}
+
+static gboolean run(const char * parser, const char * alignment, GBytes * stream, int slices, int chunk_size, guint nals)
+{
+    static int results = 0;
+    char * desc = g_strdup_printf(
+        "appsrc name=src block=true max-bytes=%d caps=video/x-h264,stream-format=byte-stream ! %s name=parser ! "
+        "%s%s%s fakesink name=sink sync=false",
+        4 * chunk_size, parser,
+        alignment ? "video/x-h264,stream-format=byte-stream,alignment=" : "", alignment ? alignment : "", alignment ? " !" : "");
+    GstElement * pipeline = gst_parse_launch(desc, NULL);
+    GstElement * src = gst_bin_get_by_name(GST_BIN(pipeline), "src");
+    GstElement * element = gst_bin_get_by_name(GST_BIN(pipeline), "parser");
+    GstElement * sink = gst_bin_get_by_name(GST_BIN(pipeline), "sink");
+    GstPad * pad = gst_element_get_static_pad(sink, "sink");
+    GstBuffer * whole = gst_buffer_new_wrapped_bytes(stream);
+    gsize size = gst_buffer_get_size(whole);
+    GstBus * bus = gst_element_get_bus(pipeline);
+    GstMessage * msg;
+    gint outputs = 0;
+    double start, cpu_start, elapsed, cpu;
+    gsize offset;
+    gboolean ok;
+
+    /* parse even where the input and output formats would allow passthrough */
+    if (g_object_class_find_property(G_OBJECT_GET_CLASS(element), "disable-passthrough"))
+        g_object_set(element, "disable-passthrough", TRUE, NULL);
+    gst_pad_add_probe(pad, GST_PAD_PROBE_TYPE_BUFFER, count_buffer, &outputs, NULL);
+
+    start = bench_now();
+    cpu_start = bench_cpu_time();
+    gst_element_set_state(pipeline, GST_STATE_PLAYING);
+    /* the chunks share the memory of the generated stream */
+    for (offset = 0; offset < size; offset += chunk_size)
+        gst_app_src_push_buffer(GST_APP_SRC(src),
+            gst_buffer_copy_region(whole, GST_BUFFER_COPY_MEMORY, offset, MIN((gsize) chunk_size, size - offset)));
+    gst_app_src_end_of_stream(GST_APP_SRC(src));
+    msg = gst_bus_timed_pop_filtered(bus, 300 * GST_SECOND, GST_MESSAGE_EOS | GST_MESSAGE_ERROR);
+    elapsed = bench_now() - start;
+    cpu = bench_cpu_time() - cpu_start;
+    ok = msg && GST_MESSAGE_TYPE(msg) == GST_MESSAGE_EOS;
+
+    if (ok) {
+        printf("%s    {\"parser\": \"%s\", \"slices_per_frame\": %d, \"chunk_size\": %d, \"alignment\": \"%s\", "
+            "\"nal_units\": %u, \"output_buffers\": %d, \"megabytes_per_second\": %.2f, \"cpu_seconds\": %.3f, \"cpu_ns_per_nal\": %.1f}",
+            results++ ? ",\n" : "", parser, slices, chunk_size, alignment ? alignment : "none",
+            nals, g_atomic_int_get(&outputs), size / elapsed / 1e6, cpu, cpu * 1e9 / nals);
+    } else {
+        g_printerr("%s: parsing with chunks of %d bytes failed\n", parser, chunk_size);
+    }
+
+    if (msg)
+        gst_message_unref(msg);
+    gst_element_set_state(pipeline, GST_STATE_NULL);
+    gst_buffer_unref(whole);
+    gst_object_unref(bus);
+    gst_object_unref(pad);
+    gst_object_unref(sink);
+    gst_object_unref(element);
+    gst_object_unref(src);
+    gst_object_unref(pipeline);
+    g_free(desc);
+    return ok;
+}
+
+int main(int argc, char * argv[])
+{
+    gsize size = (argc > 1 ? g_ascii_strtoull(argv[1], NULL, 10) : 64) * 1024 * 1024;
+    int frame_bytes = argc > 2 ? atoi(argv[2]) : 50000;
+    gboolean ok = TRUE;
+    guint i, j, k;
+
+    gst_init(&argc, &argv);
+
+#ifdef GST_STATIC_COMPILATION
+    GST_PLUGIN_STATIC_REGISTER(app);
+    GST_PLUGIN_STATIC_REGISTER(coreelements);
+    GST_PLUGIN_STATIC_REGISTER(videoparsers);
+#endif
+
+    printf("{\n  \"codec\": \"h264\",\n  \"stream_bytes\": %" G_GSIZE_FORMAT ",\n  \"frame_bytes\": %d,\n  \"results\": [\n",
+        size, frame_bytes);
+    for (i = 0; i < G_N_ELEMENTS(slice_counts) && ok; i++) {
+        guint nals;
+        GBytes * stream = generate_stream(size, slice_counts[i], frame_bytes, &nals);
+
+        for (j = 0; j < G_N_ELEMENTS(chunk_sizes) && ok; j++) {
+            ok &= run("identity", NULL, stream, slice_counts[i], chunk_sizes[j], nals);
+            for (k = 0; k < G_N_ELEMENTS(alignments) && ok; k++)
+                ok &= run("h264parse", alignments[k], stream, slice_counts[i], chunk_sizes[j], nals);
+        }
+        g_bytes_unref(stream);
+    }
+    printf("\n  ]\n}\n");
+
+    return ok ? EXIT_SUCCESS : EXIT_FAILURE;
+}
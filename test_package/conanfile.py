@@ -18,6 +18,12 @@ class TestPackageConan(ConanFile):
 
     def generate(self):
         tc = CMakeToolchain(self)
+        gstreamer_options = self.dependencies["gstreamer"].options
+        tc.variables["WITH_METRICS_TRACER"] = bool(gstreamer_options.with_metrics_tracer)
+        tc.variables["WITH_SHM"] = bool(gstreamer_options.get_safe("with_shm"))
+        tc.variables["WITH_LIBAV"] = bool(gstreamer_options.with_libav)
+        tc.variables["WITH_THREADSHARE"] = bool(gstreamer_options.with_threadshare)
+        tc.variables["WITH_VIDEOPARSERS"] = bool(gstreamer_options.with_videoparsers)
         tc.generate()
 
         deps = CMakeDeps(self)
@@ -32,3 +38,32 @@ class TestPackageConan(ConanFile):
         if can_run(self):
             cmd = os.path.join(self.cpp.build.bindir, "test_package")
             self.run(cmd, env="conanrun")
+            if self.dependencies["gstreamer"].options.with_metrics_tracer:
+                cmd = os.path.join(self.cpp.build.bindir, "test_metrics_tracer")
+                self.run(cmd, env="conanrun")
+            # leak check is opt-in: -c user.gstreamer:leak_check=report|fail
+            leak_check = self.conf.get("user.gstreamer:leak_check", check_type=str)
+            if leak_check:
+                cmd = "{} \"{}\" {}".format(os.path.join(self.cpp.build.bindir, "test_leaks"),
+                    os.path.join(self.source_folder, "leaks_baseline.ini"), leak_check)
+                self.run(cmd, env="conanrun")
+            # benchmarks are opt-in: -c user.gstreamer:benchmarks=True
+            if self.conf.get("user.gstreamer:benchmarks", check_type=bool):
+                self._run_benchmarks()
+
+    def _run_benchmarks(self):
+        gstreamer_options = self.dependencies["gstreamer"].options
+        cmd = os.path.join(self.cpp.build.bindir, "benchmark_scaling")
+        self.run(cmd, env="conanrun")
+        if gstreamer_options.get_safe("with_shm"):
+            cmd = os.path.join(self.cpp.build.bindir, "benchmark_shm")
+            self.run(cmd, env="conanrun")
+        if gstreamer_options.with_libav:
+            cmd = os.path.join(self.cpp.build.bindir, "benchmark_libav")
+            self.run(cmd, env="conanrun")
+        if gstreamer_options.with_threadshare:
+            cmd = os.path.join(self.cpp.build.bindir, "benchmark_threadshare")
+            self.run(cmd, env="conanrun")
+        if gstreamer_options.with_videoparsers:
+            cmd = os.path.join(self.cpp.build.bindir, "benchmark_videoparsers")
+            self.run(cmd, env="conanrun")
@@ -0,0 +1,193 @@
+/* generator of synthetic 1080p H.264 Annex-B streams: valid SPS, PPS and
+ * slice headers with random bytes standing in for the macroblock data, enough
+ * for parsers but not for decoders */
+#ifndef TEST_PACKAGE_H264_STREAM_H
+#define TEST_PACKAGE_H264_STREAM_H
+
+#include <glib.h>
+
+/* 1920x1088 in macroblocks, cropped to 1080 */
+#define WIDTH_MBS 120
+#define HEIGHT_MBS 68
+#define GOP_LENGTH 30
+
+typedef struct {
+    GByteArray * data;
+    guint32 acc;
+    int bits;
+} BitWriter;
+
+static inline void put_bits(BitWriter * w, guint32 value, int n)
+{
+    while (n--) {
+        w->acc = (w->acc << 1) | ((value >> n) & 1);
+        if (++w->bits == 8) {
+            guint8 byte = w->acc;
+            g_byte_array_append(w->data, &byte, 1);
+            w->acc = 0;
+            w->bits = 0;
+        }
+    }
+}
+
+/* exp-Golomb codes */
+static inline void put_ue(BitWriter * w, guint32 value)
+{
+    int length = g_bit_storage(value + 1);
+    put_bits(w, 0, length - 1);
+    put_bits(w, value + 1, length);
+}
+
+static inline void put_se(BitWriter * w, gint32 value)
+{
+    put_ue(w, value > 0 ? 2 * value - 1 : -2 * value);
+}
+
+static inline void put_trailing_bits(BitWriter * w)
+{
+    put_bits(w, 1, 1);
+    while (w->bits)
+        put_bits(w, 0, 1);
+}
+
+static inline void begin_nal(BitWriter * w, int ref_idc, int type)
+{
+    g_byte_array_set_size(w->data, 0);
+    w->acc = 0;
+    w->bits = 0;
+    put_bits(w, 0, 1);
+    put_bits(w, ref_idc, 2);
+    put_bits(w, type, 5);
+}
+
+/* start code and emulation prevention */
+static inline void append_nal(GByteArray * stream, const GByteArray * rbsp)
+{
+    static const guint8 start_code[] = { 0, 0, 0, 1 };
+    static const guint8 emulation_prevention = 3;
+    int zeros = 0;
+    guint i;
+
+    g_byte_array_append(stream, start_code, sizeof(start_code));
+    for (i = 0; i < rbsp->len; i++) {
+        if (zeros >= 2 && rbsp->data[i] <= 3) {
+            g_byte_array_append(stream, &emulation_prevention, 1);
+            zeros = 0;
+        }
+        g_byte_array_append(stream, &rbsp->data[i], 1);
+        zeros = rbsp->data[i] ? 0 : zeros + 1;
+    }
+}
+
+/* baseline profile, level 4.0, POC type 2 */
+static inline void write_sps(BitWriter * w)
+{
+    begin_nal(w, 3, 7);
+    put_bits(w, 66, 8);
+    put_bits(w, 0, 8);
+    put_bits(w, 40, 8);
+    put_ue(w, 0);
+    put_ue(w, 0);
+    put_ue(w, 2);
+    put_ue(w, 1);
+    put_bits(w, 0, 1);
+    put_ue(w, WIDTH_MBS - 1);
+    put_ue(w, HEIGHT_MBS - 1);
+    put_bits(w, 1, 1);
+    put_bits(w, 1, 1);
+    put_bits(w, 1, 1);
+    put_ue(w, 0);
+    put_ue(w, 0);
+    put_ue(w, 0);
+    put_ue(w, 4);
+    put_bits(w, 0, 1);
+    put_trailing_bits(w);
+}
+
+static inline void write_pps(BitWriter * w)
+{
+    begin_nal(w, 3, 8);
+    put_ue(w, 0);
+    put_ue(w, 0);
+    put_bits(w, 0, 1);
+    put_bits(w, 0, 1);
+    put_ue(w, 0);
+    put_ue(w, 0);
+    put_ue(w, 0);
+    put_bits(w, 0, 1);
+    put_bits(w, 0, 2);
+    put_se(w, 0);
+    put_se(w, 0);
+    put_se(w, 0);
+    put_bits(w, 1, 1);
+    put_bits(w, 0, 1);
+    put_bits(w, 0, 1);
+    put_trailing_bits(w);
+}
+
+/* a valid slice header followed by random bytes standing in for the macroblocks */
+static inline void write_slice(BitWriter * w, GRand * rand, int frame, int first_mb, int payload)
+{
+    gboolean idr = frame % GOP_LENGTH == 0;
+    guint8 * data;
+    int i;
+
+    begin_nal(w, idr ? 3 : 2, idr ? 5 : 1);
+    put_ue(w, first_mb);
+    put_ue(w, idr ? 7 : 5);
+    put_ue(w, 0);
+    put_bits(w, frame % GOP_LENGTH % 16, 4);
+    if (idr) {
+        put_ue(w, frame / GOP_LENGTH % 65536);
+    } else {
+        put_bits(w, 0, 1);
+        put_bits(w, 0, 1);
+    }
+    if (idr) {
+        put_bits(w, 0, 1);
+        put_bits(w, 0, 1);
+    } else {
+        put_bits(w, 0, 1);
+    }
+    put_se(w, 0);
+    put_ue(w, 1);
+    put_trailing_bits(w);
+
+    g_byte_array_set_size(w->data, w->data->len + payload);
+    data = w->data->data + w->data->len - payload;
+    for (i = 0; i < payload; i++)
+        data[i] = g_rand_int(rand);
+    /* no trailing zero byte */
+    data[payload - 1] = 0x80;
+}
+
+static inline GBytes * generate_stream(gsize size, int slices, int frame_bytes, guint * nal_count)
+{
+    GByteArray * stream = g_byte_array_sized_new(size + frame_bytes);
+    BitWriter w = { g_byte_array_new(), 0, 0 };
+    GRand * rand = g_rand_new_with_seed(0x264);
+    int mbs_per_slice = (WIDTH_MBS * HEIGHT_MBS + slices - 1) / slices;
+    int frame, slice;
+
+    *nal_count = 0;
+    for (frame = 0; stream->len < size; frame++) {
+        if (frame % GOP_LENGTH == 0) {
+            write_sps(&w);
+            append_nal(stream, w.data);
+            write_pps(&w);
+            append_nal(stream, w.data);
+            *nal_count += 2;
+        }
+        for (slice = 0; slice < slices; slice++) {
+            write_slice(&w, rand, frame, slice * mbs_per_slice, MAX(frame_bytes / slices, 1));
+            append_nal(stream, w.data);
+            (*nal_count)++;
+        }
+    }
+
+    g_rand_free(rand);
+    g_byte_array_unref(w.data);
+    return g_byte_array_free_to_bytes(stream);
+}
+
+#endif
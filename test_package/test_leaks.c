@@ -0,0 +1,470 @@
+/* memory footprint and leak regression check: runs a representative
+ * pipeline per packaged plugin for a fixed number of buffers with the leaks
+ * tracer, compares the objects left alive and the RSS growth per buffer with
+ * a stored baseline and prints the measurements as JSON
+ *
+ * usage: test_leaks <baseline.ini> [report|fail] [buffers] */
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <gst/gst.h>
+#include <glib/gstdio.h>
+
+#include "h264_stream.h"
+
+#ifdef G_OS_UNIX
+#include <unistd.h>
+#include <sys/resource.h>
+#endif
+
+#ifdef GST_STATIC_COMPILATION
+GST_PLUGIN_STATIC_DECLARE(coreelements);
+GST_PLUGIN_STATIC_DECLARE(coretracers);
+#ifdef HAVE_GSTADDER
+GST_PLUGIN_STATIC_DECLARE(adder);
+#endif
+#ifdef HAVE_GSTAPP
+GST_PLUGIN_STATIC_DECLARE(app);
+#endif
+#ifdef HAVE_GSTAUDIOCONVERT
+GST_PLUGIN_STATIC_DECLARE(audioconvert);
+#endif
+#ifdef HAVE_GSTAUDIOMIXER
+GST_PLUGIN_STATIC_DECLARE(audiomixer);
+#endif
+#ifdef HAVE_GSTAUDIORATE
+GST_PLUGIN_STATIC_DECLARE(audiorate);
+#endif
+#ifdef HAVE_GSTAUDIORESAMPLE
+GST_PLUGIN_STATIC_DECLARE(audioresample);
+#endif
+#ifdef HAVE_GSTAUDIOTESTSRC
+GST_PLUGIN_STATIC_DECLARE(audiotestsrc);
+#endif
+#ifdef HAVE_GSTCOMPOSITOR
+GST_PLUGIN_STATIC_DECLARE(compositor);
+#endif
+#ifdef HAVE_GSTOVERLAYCOMPOSITION
+GST_PLUGIN_STATIC_DECLARE(overlaycomposition);
+#endif
+#ifdef HAVE_GSTPLAYBACK
+GST_PLUGIN_STATIC_DECLARE(playback);
+#endif
+#ifdef HAVE_GSTRAWPARSE
+GST_PLUGIN_STATIC_DECLARE(rawparse);
+#endif
+#ifdef HAVE_GSTVIDEOCONVERTSCALE
+GST_PLUGIN_STATIC_DECLARE(videoconvertscale);
+#endif
+#ifdef HAVE_GSTVIDEORATE
+GST_PLUGIN_STATIC_DECLARE(videorate);
+#endif
+#ifdef HAVE_GSTVIDEOTESTSRC
+GST_PLUGIN_STATIC_DECLARE(videotestsrc);
+#endif
+#ifdef HAVE_GSTVOLUME
+GST_PLUGIN_STATIC_DECLARE(volume);
+#endif
+#ifdef HAVE_GSTOGG
+GST_PLUGIN_STATIC_DECLARE(ogg);
+#endif
+#ifdef HAVE_GSTOPUS
+GST_PLUGIN_STATIC_DECLARE(opus);
+#endif
+#ifdef HAVE_GSTPANGO
+GST_PLUGIN_STATIC_DECLARE(pango);
+#endif
+#ifdef HAVE_GSTTHEORA
+GST_PLUGIN_STATIC_DECLARE(theora);
+#endif
+#ifdef HAVE_GSTVORBIS
+GST_PLUGIN_STATIC_DECLARE(vorbis);
+#endif
+#ifdef HAVE_GSTLIBAV
+GST_PLUGIN_STATIC_DECLARE(libav);
+#endif
+#ifdef HAVE_GSTTHREADSHARE
+GST_PLUGIN_STATIC_DECLARE(threadshare);
+#endif
+#ifdef HAVE_GSTVIDEOPARSERS
+GST_PLUGIN_STATIC_DECLARE(videoparsers);
+#endif
+#endif
+
+static void register_plugins(void)
+{
+#ifdef GST_STATIC_COMPILATION
+    GST_PLUGIN_STATIC_REGISTER(coreelements);
+    GST_PLUGIN_STATIC_REGISTER(coretracers);
+#ifdef HAVE_GSTADDER
+    GST_PLUGIN_STATIC_REGISTER(adder);
+#endif
+#ifdef HAVE_GSTAPP
+    GST_PLUGIN_STATIC_REGISTER(app);
+#endif
+#ifdef HAVE_GSTAUDIOCONVERT
+    GST_PLUGIN_STATIC_REGISTER(audioconvert);
+#endif
+#ifdef HAVE_GSTAUDIOMIXER
+    GST_PLUGIN_STATIC_REGISTER(audiomixer);
+#endif
+#ifdef HAVE_GSTAUDIORATE
+    GST_PLUGIN_STATIC_REGISTER(audiorate);
+#endif
+#ifdef HAVE_GSTAUDIORESAMPLE
+    GST_PLUGIN_STATIC_REGISTER(audioresample);
+#endif
+#ifdef HAVE_GSTAUDIOTESTSRC
+    GST_PLUGIN_STATIC_REGISTER(audiotestsrc);
+#endif
+#ifdef HAVE_GSTCOMPOSITOR
+    GST_PLUGIN_STATIC_REGISTER(compositor);
+#endif
+#ifdef HAVE_GSTOVERLAYCOMPOSITION
+    GST_PLUGIN_STATIC_REGISTER(overlaycomposition);
+#endif
+#ifdef HAVE_GSTPLAYBACK
+    GST_PLUGIN_STATIC_REGISTER(playback);
+#endif
+#ifdef HAVE_GSTRAWPARSE
+    GST_PLUGIN_STATIC_REGISTER(rawparse);
+#endif
+#ifdef HAVE_GSTVIDEOCONVERTSCALE
+    GST_PLUGIN_STATIC_REGISTER(videoconvertscale);
+#endif
+#ifdef HAVE_GSTVIDEORATE
+    GST_PLUGIN_STATIC_REGISTER(videorate);
+#endif
+#ifdef HAVE_GSTVIDEOTESTSRC
+    GST_PLUGIN_STATIC_REGISTER(videotestsrc);
+#endif
+#ifdef HAVE_GSTVOLUME
+    GST_PLUGIN_STATIC_REGISTER(volume);
+#endif
+#ifdef HAVE_GSTOGG
+    GST_PLUGIN_STATIC_REGISTER(ogg);
+#endif
+#ifdef HAVE_GSTOPUS
+    GST_PLUGIN_STATIC_REGISTER(opus);
+#endif
+#ifdef HAVE_GSTPANGO
+    GST_PLUGIN_STATIC_REGISTER(pango);
+#endif
+#ifdef HAVE_GSTTHEORA
+    GST_PLUGIN_STATIC_REGISTER(theora);
+#endif
+#ifdef HAVE_GSTVORBIS
+    GST_PLUGIN_STATIC_REGISTER(vorbis);
+#endif
+#ifdef HAVE_GSTLIBAV
+    GST_PLUGIN_STATIC_REGISTER(libav);
+#endif
+#ifdef HAVE_GSTTHREADSHARE
+    GST_PLUGIN_STATIC_REGISTER(threadshare);
+#endif
+#ifdef HAVE_GSTVIDEOPARSERS
+    GST_PLUGIN_STATIC_REGISTER(videoparsers);
+#endif
+#endif
+}
+
+#define SMALL_VIDEO "video/x-raw,format=I420,width=320,height=240,framerate=30/1"
+/* Annex-B H.264 stream written by main(), one BLOCK_SIZE read per buffer */
+#define H264_FILE "test_leaks.h264"
+#define BLOCK_SIZE 4096
+
+typedef struct {
+    const char * plugin;
+    /* %d is replaced by the number of buffers */
+    const char * pipeline;
+} Case;
+
+/* plugins without a standalone pipeline (gio, tcp, shm, opengl, ...) are not covered */
+static const Case cases[] = {
+    { "coreelements", "fakesrc num-buffers=%d sizetype=fixed sizemax=4096 ! queue ! tee ! identity ! fakesink" },
+    { "adder", "audiotestsrc num-buffers=%d ! tee name=t t. ! queue ! mix. t. ! queue ! mix. adder name=mix ! fakesink" },
+    { "app", "videotestsrc num-buffers=%d ! " SMALL_VIDEO " ! appsink drop=true max-buffers=1 sync=false" },
+    { "audioconvert", "audiotestsrc num-buffers=%d ! audio/x-raw,format=S16LE,channels=1 ! audioconvert ! audio/x-raw,format=F32LE,channels=2 ! fakesink" },
+    { "audiomixer", "audiotestsrc num-buffers=%d ! tee name=t t. ! queue ! mix. t. ! queue ! mix. audiomixer name=mix ! fakesink" },
+    { "audiorate", "audiotestsrc num-buffers=%d ! audiorate ! fakesink" },
+    { "audioresample", "audiotestsrc num-buffers=%d ! audio/x-raw,rate=48000 ! audioresample ! audio/x-raw,rate=44100 ! fakesink" },
+    { "audiotestsrc", "audiotestsrc num-buffers=%d ! fakesink" },
+    { "compositor", "videotestsrc num-buffers=%d ! " SMALL_VIDEO " ! tee name=t t. ! queue ! mix. t. ! queue ! mix. compositor name=mix ! fakesink" },
+    { "overlaycomposition", "videotestsrc num-buffers=%d ! " SMALL_VIDEO " ! overlaycomposition ! fakesink" },
+    { "playback", "videotestsrc num-buffers=%d ! " SMALL_VIDEO " ! decodebin ! fakesink" },
+    { "rawparse", "fakesrc num-buffers=%d sizetype=fixed sizemax=115200 filltype=zero ! rawvideoparse format=i420 width=320 height=240 ! fakesink" },
+    { "videoconvertscale", "videotestsrc num-buffers=%d ! video/x-raw,width=640,height=480 ! videoconvertscale ! video/x-raw,format=BGRA,width=320,height=240 ! fakesink" },
+    { "videorate", "videotestsrc num-buffers=%d ! " SMALL_VIDEO " ! videorate ! video/x-raw,framerate=15/1 ! fakesink" },
+    { "videotestsrc", "videotestsrc num-buffers=%d ! " SMALL_VIDEO " ! fakesink" },
+    { "volume", "audiotestsrc num-buffers=%d ! volume volume=0.5 ! fakesink" },
+    { "ogg", "audiotestsrc num-buffers=%d ! audioconvert ! vorbisenc ! oggmux ! oggdemux ! fakesink" },
+    { "opus", "audiotestsrc num-buffers=%d ! audio/x-raw,rate=48000 ! opusenc ! opusdec ! fakesink" },
+    { "pango", "videotestsrc num-buffers=%d ! " SMALL_VIDEO " ! textoverlay text=leaks ! fakesink" },
+    { "theora", "videotestsrc num-buffers=%d ! " SMALL_VIDEO " ! theoraenc ! theoradec ! fakesink" },
+    { "vorbis", "audiotestsrc num-buffers=%d ! audioconvert ! vorbisenc ! vorbisdec ! fakesink" },
+    { "libav", "videotestsrc num-buffers=%d ! " SMALL_VIDEO " ! avenc_mpeg4 ! avdec_mpeg4 ! fakesink" },
+    { "threadshare", "fakesrc num-buffers=%d sizetype=fixed sizemax=4096 ! ts-queue ! fakesink" },
+    { "videoparsers", "filesrc location=" H264_FILE " blocksize=" G_STRINGIFY(BLOCK_SIZE) " num-buffers=%d ! video/x-h264,stream-format=byte-stream ! "
+        "h264parse ! video/x-h264,alignment=au ! fakesink" },
+};
+
+/* counts the objects and mini objects created while installed */
+typedef struct {
+    GstTracer parent;
+    gint allocations;
+} AllocationCounter;
+
+typedef struct {
+    GstTracerClass parent_class;
+} AllocationCounterClass;
+
+G_DEFINE_TYPE(AllocationCounter, allocation_counter, GST_TYPE_TRACER)
+
+static void count_allocation(GObject * tracer, GstClockTime ts, gpointer object)
+{
+    g_atomic_int_inc(&((AllocationCounter *) tracer)->allocations);
+}
+
+static void allocation_counter_class_init(AllocationCounterClass * klass)
+{
+}
+
+static void allocation_counter_init(AllocationCounter * self)
+{
+    gst_tracing_register_hook(GST_TRACER(self), "mini-object-created", G_CALLBACK(count_allocation));
+    gst_tracing_register_hook(GST_TRACER(self), "object-created", G_CALLBACK(count_allocation));
+}
+
+static GstTracer * create_leaks_tracer(void)
+{
+    GstPluginFeature * feature = gst_registry_find_feature(gst_registry_get(), "leaks", GST_TYPE_TRACER_FACTORY);
+    GstPluginFeature * loaded;
+    GstTracer * tracer;
+    if (!feature)
+        return NULL;
+    loaded = gst_plugin_feature_load(feature);
+    gst_object_unref(feature);
+    if (!loaded)
+        return NULL;
+    tracer = g_object_new(gst_tracer_factory_get_tracer_type(GST_TRACER_FACTORY(loaded)), NULL);
+    gst_object_unref(loaded);
+    return tracer;
+}
+
+static guint count_live_objects(GstTracer * leaks)
+{
+    GstStructure * live = NULL;
+    guint count;
+    g_signal_emit_by_name(leaks, "get-live-objects", &live);
+    count = gst_value_list_get_size(gst_structure_get_value(live, "live-objects-list"));
+    gst_structure_free(live);
+    return count;
+}
+
+/* -1 where not available */
+static gint64 current_rss(void)
+{
+#ifdef __linux__
+    char * statm = NULL;
+    gint64 pages = -1;
+    if (g_file_get_contents("/proc/self/statm", &statm, NULL, NULL)) {
+        /* size resident shared ... */
+        char * resident = strchr(statm, ' ');
+        if (resident)
+            pages = g_ascii_strtoll(resident, NULL, 10);
+        g_free(statm);
+    }
+    return pages < 0 ? -1 : pages * sysconf(_SC_PAGESIZE);
+#else
+    return -1;
+#endif
+}
+
+/* highest current_rss() seen while running, ru_maxrss only covers the whole process */
+typedef struct {
+    GThread * thread;
+    gint running;
+    gint64 peak;
+} RssSampler;
+
+static gpointer sample_rss(gpointer user_data)
+{
+    RssSampler * sampler = user_data;
+    do {
+        sampler->peak = MAX(sampler->peak, current_rss());
+        g_usleep(5000);
+    } while (g_atomic_int_get(&sampler->running));
+    return NULL;
+}
+
+static void start_rss_sampler(RssSampler * sampler)
+{
+    sampler->running = 1;
+    sampler->peak = -1;
+    sampler->thread = g_thread_new("rss-sampler", sample_rss, sampler);
+}
+
+/* -1 where not available */
+static gint64 stop_rss_sampler(RssSampler * sampler)
+{
+    g_atomic_int_set(&sampler->running, 0);
+    g_thread_join(sampler->thread);
+    return MAX(sampler->peak, current_rss());
+}
+
+static gint64 peak_rss(void)
+{
+#ifdef G_OS_UNIX
+    struct rusage usage;
+    getrusage(RUSAGE_SELF, &usage);
+#ifdef __APPLE__
+    return usage.ru_maxrss;
+#else
+    return usage.ru_maxrss * (gint64) 1024;
+#endif
+#else
+    return -1;
+#endif
+}
+
+static gboolean write_h264_file(int buffers)
+{
+    guint nals;
+    GBytes * stream = generate_stream((gsize) buffers * BLOCK_SIZE, 1, BLOCK_SIZE, &nals);
+    gsize size;
+    const char * data = g_bytes_get_data(stream, &size);
+    gboolean ok = g_file_set_contents(H264_FILE, data, size, NULL);
+    g_bytes_unref(stream);
+    return ok;
+}
+
+static gboolean run_pipeline(const char * template, int buffers)
+{
+    char * desc = g_strdup_printf(template, buffers);
+    GstElement * pipeline = gst_parse_launch_full(desc, NULL, GST_PARSE_FLAG_FATAL_ERRORS, NULL);
+    GstBus * bus;
+    GstMessage * msg;
+    gboolean ok;
+
+    g_free(desc);
+    if (!pipeline)
+        return FALSE;
+    bus = gst_element_get_bus(pipeline);
+    gst_element_set_state(pipeline, GST_STATE_PLAYING);
+    msg = gst_bus_timed_pop_filtered(bus, 120 * GST_SECOND, GST_MESSAGE_EOS | GST_MESSAGE_ERROR);
+    ok = msg && GST_MESSAGE_TYPE(msg) == GST_MESSAGE_EOS;
+    if (msg)
+        gst_message_unref(msg);
+    gst_element_set_state(pipeline, GST_STATE_NULL);
+    gst_object_unref(bus);
+    gst_object_unref(pipeline);
+    return ok;
+}
+
+/* limits of the plugin group, falling back to the [default] group */
+static double baseline_limit(GKeyFile * baseline, const char * plugin, const char * key)
+{
+    const char * groups[] = { plugin, "default", NULL };
+    int i;
+    for (i = 0; groups[i]; i++) {
+        if (g_key_file_has_key(baseline, groups[i], key, NULL))
+            return g_key_file_get_double(baseline, groups[i], key, NULL);
+    }
+    return -1;
+}
+
+static int check(const char * plugin, const char * key, double value, GKeyFile * baseline, GString * regressions)
+{
+    double limit = baseline_limit(baseline, plugin, key);
+    if (limit < 0 || value <= limit)
+        return 0;
+    g_printerr("%s: %s %.1f exceeds the baseline of %.1f\n", plugin, key, value, limit);
+    g_string_append_printf(regressions, "%s\"%s\"", regressions->len ? ", " : "", key);
+    return 1;
+}
+
+/* returns the number of regressions */
+static int run_case(const Case * c, int buffers, GstTracer * leaks, AllocationCounter * counter, GKeyFile * baseline)
+{
+    static int results = 0;
+    GString * regressions;
+    guint live_before, live_after;
+    gint64 rss_before, rss_after, rss_peak;
+    RssSampler sampler;
+    gint allocations;
+    double memory_per_buffer;
+    int failures = 0;
+    gboolean ok;
+
+    printf("%s    {\"plugin\": \"%s\"", results++ ? ",\n" : "", c->plugin);
+    /* the warm-up loads the plugin and fills the per-class caches, which are not leaks */
+    if (!run_pipeline(c->pipeline, 10)) {
+        printf(", \"skipped\": \"pipeline not available\"}");
+        return 0;
+    }
+
+    live_before = count_live_objects(leaks);
+    rss_before = current_rss();
+    g_atomic_int_set(&counter->allocations, 0);
+    start_rss_sampler(&sampler);
+    ok = run_pipeline(c->pipeline, buffers);
+    rss_peak = stop_rss_sampler(&sampler);
+    if (!ok) {
+        printf(", \"skipped\": \"pipeline failed\"}");
+        return 1;
+    }
+    allocations = g_atomic_int_get(&counter->allocations);
+    live_after = count_live_objects(leaks);
+    rss_after = current_rss();
+    memory_per_buffer = rss_before < 0 ? -1 : MAX(rss_after - rss_before, 0) / (double) buffers;
+
+    regressions = g_string_new(NULL);
+    failures += check(c->plugin, "live_objects", (double) live_after - live_before, baseline, regressions);
+    failures += check(c->plugin, "memory_per_buffer", memory_per_buffer, baseline, regressions);
+    printf(", \"live_objects\": %d, \"allocations\": %d, \"allocations_per_buffer\": %.2f, "
+        "\"rss_growth_bytes\": %" G_GINT64_FORMAT ", \"memory_per_buffer\": %.1f, \"peak_rss_bytes\": %" G_GINT64_FORMAT ", "
+        "\"regressions\": [%s]}",
+        (int) live_after - (int) live_before, allocations, allocations / (double) buffers,
+        rss_before < 0 ? -1 : rss_after - rss_before, memory_per_buffer, rss_peak, regressions->str);
+    g_string_free(regressions, TRUE);
+    return failures;
+}
+
+int main(int argc, char * argv[])
+{
+    const char * mode = argc > 2 ? argv[2] : "report";
+    int buffers = argc > 3 ? atoi(argv[3]) : 1000;
+    GKeyFile * baseline = g_key_file_new();
+    GError * err = NULL;
+    GstTracer * leaks;
+    AllocationCounter * counter;
+    int regressions = 0;
+    guint i;
+
+    gst_init(&argc, &argv);
+    register_plugins();
+
+    if (argc < 2 || !g_key_file_load_from_file(baseline, argv[1], G_KEY_FILE_NONE, &err)) {
+        printf("failed to load the baseline: %s\n", err ? err->message : "no file given");
+        g_clear_error(&err);
+        return EXIT_FAILURE;
+    }
+    leaks = create_leaks_tracer();
+    if (!leaks) {
+        printf("failed to create the leaks tracer\n");
+        return EXIT_FAILURE;
+    }
+    counter = g_object_new(allocation_counter_get_type(), NULL);
+    /* the videoparsers case is skipped without it */
+    if (!write_h264_file(buffers))
+        g_printerr("failed to write %s\n", H264_FILE);
+
+    printf("{\n  \"buffers\": %d,\n  \"mode\": \"%s\",\n  \"results\": [\n", buffers, mode);
+    for (i = 0; i < G_N_ELEMENTS(cases); i++)
+        regressions += run_case(&cases[i], buffers, leaks, counter, baseline);
+    printf("\n  ],\n  \"regressions\": %d,\n  \"peak_rss_bytes\": %" G_GINT64_FORMAT "\n}\n", regressions, peak_rss());
+
+    g_remove(H264_FILE);
+    g_key_file_free(baseline);
+    return regressions && strcmp(mode, "fail") == 0 ? EXIT_FAILURE : EXIT_SUCCESS;
+}
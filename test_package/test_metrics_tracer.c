@@ -0,0 +1,149 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <gst/gst.h>
+#include <gio/gio.h>
+#include <glib/gstdio.h>
+
+#ifdef GST_STATIC_COMPILATION
+GST_PLUGIN_STATIC_DECLARE(coreelements);
+GST_PLUGIN_STATIC_DECLARE(metricstracer);
+#endif
+
+static const char * expected_metrics[] = {
+    "gst_pad_buffers_total{pipeline=\"test\",element=\"src\",pad=\"src\"} 1000",
+    "gst_pad_bytes_total{pipeline=\"test\",element=\"src\",pad=\"src\"} 1024000",
+    "gst_element_processed_buffers_total{pipeline=\"test\",element=\"identity\"} 1000",
+    /* sinks are accounted as well */
+    "gst_element_processed_buffers_total{pipeline=\"test\",element=\"sink\"} 1000",
+    "gst_queue_level_buffers{pipeline=\"test\",element=\"queue\"}",
+    "# EOF",
+    NULL
+};
+
+static GstTracer * create_tracer(const char * params)
+{
+    GstPluginFeature * feature = gst_registry_find_feature(gst_registry_get(), "openmetrics", GST_TYPE_TRACER_FACTORY);
+    GstPluginFeature * loaded;
+    GstTracer * tracer;
+    if (!feature)
+        return NULL;
+    loaded = gst_plugin_feature_load(feature);
+    gst_object_unref(feature);
+    if (!loaded)
+        return NULL;
+    tracer = g_object_new(gst_tracer_factory_get_tracer_type(GST_TRACER_FACTORY(loaded)), "params", params, NULL);
+    gst_object_unref(loaded);
+    return tracer;
+}
+
+/* stand-in for the metrics scraper: one HTTP request per scrape */
+static char * scrape(GSocketAddress * address)
+{
+    static const char request[] = "GET /metrics HTTP/1.0\r\n\r\n";
+    GSocketClient * client = g_socket_client_new();
+    GSocketConnection * connection;
+    GString * response;
+    char chunk[4096];
+    gssize n;
+    GError * err = NULL;
+
+    connection = g_socket_client_connect(client, G_SOCKET_CONNECTABLE(address), NULL, &err);
+    g_object_unref(client);
+    if (!connection) {
+        printf("failed to connect to the metrics endpoint: %s\n", err->message);
+        g_clear_error(&err);
+        return NULL;
+    }
+    g_output_stream_write_all(g_io_stream_get_output_stream(G_IO_STREAM(connection)), request, strlen(request), NULL, NULL, NULL);
+    response = g_string_new(NULL);
+    while ((n = g_input_stream_read(g_io_stream_get_input_stream(G_IO_STREAM(connection)), chunk, sizeof(chunk), NULL, NULL)) > 0)
+        g_string_append_len(response, chunk, n);
+    g_object_unref(connection);
+    return g_string_free(response, FALSE);
+}
+
+int main(int argc, char * argv[])
+{
+    char * tmpdir;
+    char * endpoint;
+    char * params;
+    char * metrics = NULL;
+    GSocketAddress * address = NULL;
+    GstTracer * tracer;
+    GstElement * pipeline;
+    GstBus * bus;
+    GstMessage * msg;
+    int i, ret = EXIT_SUCCESS;
+
+    gst_init(&argc, &argv);
+
+#ifdef GST_STATIC_COMPILATION
+    GST_PLUGIN_STATIC_REGISTER(coreelements);
+    GST_PLUGIN_STATIC_REGISTER(metricstracer);
+#endif
+
+    tmpdir = g_dir_make_tmp("gst-metrics-XXXXXX", NULL);
+#ifdef G_OS_UNIX
+    endpoint = g_build_filename(tmpdir, "metrics.sock", NULL);
+    params = g_strdup_printf("socket=\"%s\"", endpoint);
+    address = g_unix_socket_address_new(endpoint);
+#else
+    endpoint = g_build_filename(tmpdir, "metrics.prom", NULL);
+    /* backslashes would be taken as escapes in the quoted tracer params */
+    g_strdelimit(endpoint, "\\", '/');
+    params = g_strdup_printf("file=\"%s\",interval=100", endpoint);
+#endif
+
+    tracer = create_tracer(params);
+    if (!tracer) {
+        printf("failed to create the openmetrics tracer\n");
+        return EXIT_FAILURE;
+    }
+
+    pipeline = gst_parse_launch(
+        "fakesrc name=src num-buffers=1000 sizetype=fixed sizemax=1024 ! queue name=queue ! identity name=identity ! fakesink name=sink", NULL);
+    gst_object_set_name(GST_OBJECT(pipeline), "test");
+    gst_element_set_state(pipeline, GST_STATE_PLAYING);
+    bus = gst_element_get_bus(pipeline);
+    msg = gst_bus_timed_pop_filtered(bus, 10 * GST_SECOND, GST_MESSAGE_EOS | GST_MESSAGE_ERROR);
+    if (!msg || GST_MESSAGE_TYPE(msg) != GST_MESSAGE_EOS) {
+        printf("pipeline did not reach EOS\n");
+        ret = EXIT_FAILURE;
+    }
+    if (msg)
+        gst_message_unref(msg);
+
+    /* scrape while the pipeline is still alive so the queue gauges are exported */
+    if (address) {
+        metrics = scrape(address);
+    } else {
+        g_usleep(300 * G_TIME_SPAN_MILLISECOND);
+        g_file_get_contents(endpoint, &metrics, NULL, NULL);
+    }
+
+    if (!metrics) {
+        printf("no metrics received\n");
+        ret = EXIT_FAILURE;
+    } else {
+        printf("%s\n", metrics);
+        for (i = 0; expected_metrics[i]; i++) {
+            if (!strstr(metrics, expected_metrics[i])) {
+                printf("missing metric: %s\n", expected_metrics[i]);
+                ret = EXIT_FAILURE;
+            }
+        }
+    }
+
+    gst_element_set_state(pipeline, GST_STATE_NULL);
+    gst_object_unref(bus);
+    gst_object_unref(pipeline);
+    g_free(metrics);
+    g_clear_object(&address);
+    g_unlink(endpoint);
+    g_rmdir(tmpdir);
+    g_free(params);
+    g_free(endpoint);
+    g_free(tmpdir);
+    return ret;
+}
@@ -1,14 +1,45 @@
 #include <stdlib.h>
 #include <stdio.h>
+#include <string.h>
 #include <gst/gst.h>
 
 #ifdef GST_STATIC_COMPILATION
 GST_PLUGIN_STATIC_DECLARE(coreelements);
 #endif
 
+static int count_shared_objects(void)
+{
+#ifdef __linux__
+    /* count the distinct shared objects mapped into the process */
+    FILE * maps = fopen("/proc/self/maps", "r");
+    GHashTable * objects;
+    char line[4096];
+    int count;
+    if (!maps)
+        return -1;
+    objects = g_hash_table_new_full(g_str_hash, g_str_equal, g_free, NULL);
+    while (fgets(line, sizeof(line), maps)) {
+        char * path = strchr(line, '/');
+        if (path && strstr(path, ".so")) {
+            path[strcspn(path, "\n")] = '\0';
+            g_hash_table_add(objects, g_strdup(path));
+        }
+    }
+    fclose(maps);
+    count = g_hash_table_size(objects);
+    g_hash_table_destroy(objects);
+    return count;
+#else
+    return -1;
+#endif
+}
+
 int main(int argc, char * argv[])
 {
+    gint64 start = g_get_monotonic_time();
     gst_init(&argc, &argv);
+    printf("gst_init() took %.3f ms\n", (g_get_monotonic_time() - start) / 1000.0);
+    printf("shared objects loaded: %d\n", count_shared_objects());
     printf("GStreamer version: %s\n", gst_version_string());
 
 #ifdef GST_STATIC_COMPILATION